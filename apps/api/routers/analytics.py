@@ -1,14 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from apps.core.database import Session
-from apps.core.database import SessionLocal, get_session
+from apps.core.database import get_read_session, get_session
 
 from apps.models.salesRecord import SalesRecord
 from apps.models.analyticsSummary import AnalyticsSummary
+from apps.models.uploadedFile import UploadedFile
+from apps.models.product import Product
+from apps.models.region import Region
+from apps.core.config import ANALYTICS_SOURCE
+from apps.service.sidecar import can_query, sidecar_totals
+from apps.service.dimensions import month_label, to_date_key
 from apps.api.schemas.schemas import AnalyticsSummaryResponse
+from apps.api.routers.auth import get_current_user
 from fastapi.encoders import jsonable_encoder
 from typing import Dict, Optional
-from sqlalchemy import func
+from datetime import date
+from functools import lru_cache
+from sqlalchemy import bindparam, func, select
 import redis
 import json
 
@@ -17,27 +26,53 @@ router = APIRouter(prefix="/analytics", tags=["Analytics"])
 # Redis qoşulma
 r = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def cache_key_builder(prefix: str, **kwargs):
     key = prefix + ":" + ":".join([f"{k}={v}" for k, v in kwargs.items() if v is not None])
     return key
 
+# ------------------------------
+# Prepared statements
+# ------------------------------
+# The per-request queries are built once, with bindparam() placeholders for the values:
+# a request only binds its parameters, so neither the statement nor its cache key is
+# rebuilt, and SQLAlchemy's compiled cache hands back the same SQL every time.
+_source = UploadedFile.__table__.alias("source")
+# Deduplicated uploads keep their rows and summary under the original upload's file_key
+FILE_KEY_OF_UPLOAD = select(func.coalesce(_source.c.file_key, UploadedFile.file_key)) \
+    .select_from(UploadedFile) \
+    .outerjoin(_source, UploadedFile.source_file_id == _source.c.id) \
+    .where(UploadedFile.id == bindparam("file_id"), UploadedFile.user_id == bindparam("user_id"))
+PARQUET_PATH_OF_KEY = select(UploadedFile.parquet_path).where(UploadedFile.file_key == bindparam("file_key"))
+SUMMARY_OF_KEY = select(AnalyticsSummary).where(AnalyticsSummary.file_key == bindparam("file_key")).limit(1)
+
+# None for an unknown file_id, or an upload of another user
+def resolve_file_key(db: Session, file_id: str, user_id: int) -> Optional[int]:
+    return db.execute(FILE_KEY_OF_UPLOAD, {"file_id": file_id, "user_id": user_id}).scalar()
+
+def owned_file_key(db: Session, file_id: str, user_id: int) -> int:
+    data_file_key = resolve_file_key(db, file_id, user_id)
+    if data_file_key is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return data_file_key
+
+# Parquet copy of the upload, when analytics should be answered from it
+def sidecar_for(db: Session, data_file_key: int):
+    if ANALYTICS_SOURCE != "sidecar":
+        return None
+    path = db.execute(PARQUET_PATH_OF_KEY, {"file_key": data_file_key}).scalar()
+    return path if can_query(path) else None
+
 # ------------------------------
 # AnalyticsSummary-based endpoints
 # ------------------------------
 @router.get("/summary/{file_id}", response_model=AnalyticsSummaryResponse)
-def analytics_summary(file_id: str, db: Session = Depends(get_db)):
-    key = f"summary:{file_id}"
+def analytics_summary(file_id: str, db: Session = Depends(get_read_session), current_user=Depends(get_current_user)):
+    key = f"summary:{current_user.id}:{file_id}"
     if cached := r.get(key):
         return json.loads(cached)
 
-    analytics = db.query(AnalyticsSummary).filter(AnalyticsSummary.uploaded_file_id == file_id).first()
+    data_file_key = owned_file_key(db, file_id, current_user.id)
+    analytics = db.execute(SUMMARY_OF_KEY, {"file_key": data_file_key}).scalar()
     if not analytics:
         raise HTTPException(status_code=404, detail="Analytics tapılmadı")
 
@@ -45,38 +80,104 @@ def analytics_summary(file_id: str, db: Session = Depends(get_db)):
     r.setex(key, 300, json.dumps(data))  # 5 dəqiqə cache
     return data
 
+# ------------------------------
+# SalesRecord aggregation queries
+# ------------------------------
+# Shaped around the covering indexes on sales_records (see SalesRecord.__table_args__);
+# benchmarks/check_query_plans.py asserts that each of them is answered from an index.
+# Each *_query() returns a prepared statement and the parameters to execute it with;
+# the statement for each combination of filters is built on first use and then reused.
+@lru_cache(maxsize=None)
+def products_statement(start_date: bool, end_date: bool, region: bool, product_name: bool):
+    statement = select(Product.name,
+                       func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")) \
+        .join(Product, SalesRecord.product_id == Product.id) \
+        .where(SalesRecord.file_key == bindparam("file_key"))
+
+    if start_date:
+        statement = statement.where(SalesRecord.date_key >= bindparam("start_date"))
+    if end_date:
+        statement = statement.where(SalesRecord.date_key <= bindparam("end_date"))
+    if region:
+        statement = statement.join(Region, SalesRecord.region_id == Region.id) \
+                             .where(Region.name == bindparam("region"))
+    if product_name:
+        statement = statement.where(Product.name == bindparam("product_name"))
+
+    return statement.group_by(Product.name)
+
+def products_query(data_file_key: int, start_date=None, end_date=None, region=None, product_name=None):
+    params = {"file_key": data_file_key}
+    if start_date:
+        params["start_date"] = to_date_key(start_date)
+    if end_date:
+        params["end_date"] = to_date_key(end_date)
+    if region:
+        params["region"] = region
+    if product_name:
+        params["product_name"] = product_name
+    return products_statement(bool(start_date), bool(end_date), bool(region), bool(product_name)), params
+
+@lru_cache(maxsize=None)
+def regions_statement(start_date: bool, end_date: bool):
+    statement = select(Region.name,
+                       func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")) \
+        .join(Region, SalesRecord.region_id == Region.id) \
+        .where(SalesRecord.file_key == bindparam("file_key"))
+
+    if start_date:
+        statement = statement.where(SalesRecord.date_key >= bindparam("start_date"))
+    if end_date:
+        statement = statement.where(SalesRecord.date_key <= bindparam("end_date"))
+
+    return statement.group_by(Region.name)
+
+def regions_query(data_file_key: int, start_date=None, end_date=None):
+    params = {"file_key": data_file_key}
+    if start_date:
+        params["start_date"] = to_date_key(start_date)
+    if end_date:
+        params["end_date"] = to_date_key(end_date)
+    return regions_statement(bool(start_date), bool(end_date)), params
+
+# date_key is yyyymmdd, so integer division by 100 gives the month. Rows whose legacy date
+# could not be parsed have no date_key: they form one NULL month (see month_label)
+MONTHLY_STATEMENT = select(
+    (SalesRecord.date_key // 100).label("month"),
+    func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")
+).where(SalesRecord.file_key == bindparam("file_key")) \
+ .group_by("month") \
+ .order_by("month")
+
+def monthly_query(data_file_key: int):
+    return MONTHLY_STATEMENT, {"file_key": data_file_key}
+
 # ------------------------------
 # SalesRecord aggregation endpoints
 # ------------------------------
 @router.get("/products", response_model=Dict)
 def analytics_products(
     file_id: str = Query(...),
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
     region: Optional[str] = Query(None),
     product_name: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_session),
+    current_user=Depends(get_current_user)
 ):
-    key = cache_key_builder("products", file_id=file_id, start_date=start_date, end_date=end_date,
+    # Cached per user: another user's request for the same file_id must not hit this entry
+    key = cache_key_builder("products", user_id=current_user.id, file_id=file_id, start_date=start_date, end_date=end_date,
                             region=region, product_name=product_name)
     if cached := r.get(key):
         return json.loads(cached)
 
-    query = db.query(SalesRecord.product_name,
-                     func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")) \
-              .filter(SalesRecord.uploaded_file_id == file_id)
+    data_file_key = owned_file_key(db, file_id, current_user.id)
+    if sidecar := sidecar_for(db, data_file_key):
+        result = sidecar_totals(sidecar, "product_name", start_date, end_date, region, product_name)
+        r.setex(key, 300, json.dumps(result))
+        return result
 
-    if start_date:
-        query = query.filter(SalesRecord.date >= start_date)
-    if end_date:
-        query = query.filter(SalesRecord.date <= end_date)
-    if region:
-        query = query.filter(SalesRecord.region == region)
-    if product_name:
-        query = query.filter(SalesRecord.product_name == product_name)
-
-    query = query.group_by(SalesRecord.product_name)
-    result = {p: s for p, s in query.all()}
+    result = {p: s for p, s in db.execute(*products_query(data_file_key, start_date, end_date, region, product_name))}
 
     r.setex(key, 300, json.dumps(result))
     return result
@@ -84,42 +185,40 @@ def analytics_products(
 @router.get("/regions", response_model=Dict)
 def analytics_regions(
     file_id: str = Query(...),
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: Session = Depends(get_read_session),
+    current_user=Depends(get_current_user)
 ):
-    key = cache_key_builder("regions", file_id=file_id, start_date=start_date, end_date=end_date)
+    key = cache_key_builder("regions", user_id=current_user.id, file_id=file_id, start_date=start_date, end_date=end_date)
     if cached := r.get(key):
         return json.loads(cached)
 
-    query = db.query(SalesRecord.region,
-                     func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")) \
-              .filter(SalesRecord.uploaded_file_id == file_id)
-
-    if start_date:
-        query = query.filter(SalesRecord.date >= start_date)
-    if end_date:
-        query = query.filter(SalesRecord.date <= end_date)
+    data_file_key = owned_file_key(db, file_id, current_user.id)
+    if sidecar := sidecar_for(db, data_file_key):
+        result = sidecar_totals(sidecar, "region", start_date, end_date)
+        r.setex(key, 300, json.dumps(result))
+        return result
 
-    query = query.group_by(SalesRecord.region)
-    result = {rgn: s for rgn, s in query.all()}
+    result = {rgn: s for rgn, s in db.execute(*regions_query(data_file_key, start_date, end_date))}
 
     r.setex(key, 300, json.dumps(result))
     return result
 
 @router.get("/monthly-trends", response_model=Dict)
-def analytics_monthly(file_id: str = Query(...), db: Session = Depends(get_db)):
-    key = f"monthly_trends:{file_id}"
+def analytics_monthly(file_id: str = Query(...), db: Session = Depends(get_read_session),
+                      current_user=Depends(get_current_user)):
+    key = f"monthly_trends:{current_user.id}:{file_id}"
     if cached := r.get(key):
         return json.loads(cached)
 
-    query = db.query(
-        func.strftime("%Y-%m", SalesRecord.date).label("month"),
-        func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")
-    ).filter(SalesRecord.uploaded_file_id == file_id) \
-     .group_by("month")
+    data_file_key = owned_file_key(db, file_id, current_user.id)
+    if sidecar := sidecar_for(db, data_file_key):
+        result = sidecar_totals(sidecar, "month")
+        r.setex(key, 300, json.dumps(result))
+        return result
 
-    result = {month: total for month, total in query.all()}
+    result = {month_label(month): total for month, total in db.execute(*monthly_query(data_file_key))}
 
     r.setex(key, 300, json.dumps(result))
     return result
@@ -3,8 +3,14 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 
 import secrets
-from sqlmodel import Session
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from apps.core.database import get_async_session, set_user_shard
 from apps.models.refreshToken import RefreshToken
+from apps.models.user import User
 
 # Parol hashing üçün
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -43,3 +49,28 @@ def create_refresh_token(user_id: int, session: Session):
     session.refresh(refresh)
     return refresh.token
 
+
+# OAuth2
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
+
+# Current user lookup, built once: every authenticated request only binds the id
+USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+
+
+# Current user dependency (apps/main.py and the routers)
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_session)):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id: str = payload.get("sub")
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        user_id = int(user_id)
+    except (JWTError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = await db.scalar(USER_BY_ID, {"user_id": user_id})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Later queries in this request go to the user's shard (when SQLITE_SHARDS is on)
+    set_user_shard(user.id)
+    return user
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from datetime import datetime
 
 
@@ -13,10 +13,49 @@ class UploadedFileResponse(BaseModel):
     status: str
     error_message: Optional[str]
     uploaded_at: datetime
+    size_bytes: Optional[int] = None
+    row_estimate: Optional[int] = None
+    rows_parsed: Optional[int] = None
+    rows_inserted: Optional[int] = None
+    rows_rejected: Optional[int] = None
+    bytes_read: Optional[int] = None
+    stage_timings: Optional[Dict[str, float]] = None
+    rows_per_sec: Optional[float] = None
+    rejection_counts: Optional[Dict[str, int]] = None
 
     class Config:
         orm_mode = True
 
+class UploadBatchResponse(BaseModel):
+    id: str
+    status: str
+    error_message: Optional[str] = None
+    file_count: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    files: List[UploadedFileResponse] = []
+    total_sales_product: Optional[Dict[str, float]] = None
+    total_sales_region: Optional[Dict[str, float]] = None
+    monthly_trends: Optional[Dict[str, float]] = None
+
+    class Config:
+        orm_mode = True
+
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    size_bytes: int
+    chunk_size: Optional[int] = None
+
+class ResumableUploadResponse(BaseModel):
+    id: str
+    filename: str
+    size_bytes: int
+    chunk_size: int
+    total_chunks: int
+    status: str
+    received_chunks: List[int] = []
+    uploaded_file_id: Optional[str] = None
+
 class AnalyticsSummaryResponse(BaseModel):
     total_sales_product: Dict[str, float]
     total_sales_region: Dict[str, float]
@@ -26,6 +65,12 @@ class AnalyticsSummaryResponse(BaseModel):
         orm_mode = True
 
 
+# Summary of one upload, identified by its public id
+class FileAnalyticsResponse(AnalyticsSummaryResponse):
+    id: int
+    uploaded_file_id: str
+
+
 class UserBase(BaseModel):
     name: str
     age: int
@@ -1,21 +1,306 @@
 # apps/core/database.py
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.sql.util import find_tables
 from contextlib import contextmanager
-from sqlmodel import Session, SQLModel
 
-# SQLite URL
-SQL_DB_URL = "sqlite:///./itprogger.db"
+from apps.core.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, DB_ECHO,
+    DATABASE_READ_URL, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW, DB_LATENCY_SAMPLES,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE,
+    SQLITE_TEMP_STORE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_AUTO_VACUUM, SQLITE_SHARDS, SHARD_DIR,
+)
+
+# SQLite by default; set DATABASE_URL for PostgreSQL
+SQL_DB_URL = DATABASE_URL
+READ_DB_URL = DATABASE_READ_URL
+
+# --- SQLite connection profile ---
+SQLITE_PRAGMAS = {
+    # Only takes effect before the first table is created (existing files: see migrations)
+    "auto_vacuum": SQLITE_AUTO_VACUUM,
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": SQLITE_TEMP_STORE,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+}
+# Read-only connections: the read-side settings only (journal mode, auto_vacuum and
+# synchronous belong to the writers), then query_only so any write fails
+READ_ONLY_PRAGMAS = {
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": SQLITE_TEMP_STORE,
+    "query_only": 1,
+}
+
+# --- Connection pool (shared by every engine built here) ---
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+READ_POOL_OPTIONS = {**POOL_OPTIONS, "pool_size": DB_READ_POOL_SIZE, "max_overflow": DB_READ_MAX_OVERFLOW}
+# PostgreSQL sessions of the read-only engine start every transaction READ ONLY
+READ_ONLY_CONNECT_ARGS = {"options": "-c default_transaction_read_only=on"}
+
+
+# --- Statement latency per pool ---
+class QueryStats:
+    """Count and recent latencies of the statements run through the engines of one pool kind."""
+
+    def __init__(self, samples: int = DB_LATENCY_SAMPLES):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=samples)
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        with self.lock:
+            recent = sorted(self.recent)
+            count, total = self.count, self.total
+        pct = lambda p: round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 3) if recent else None  # noqa: E731
+        return {
+            "statements": count,
+            "mean_ms": round(total / count * 1000, 3) if count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(recent[-1] * 1000, 3) if recent else None,
+        }
+
+
+QUERY_STATS = {"write": QueryStats(), "read": QueryStats()}
+
+
+def track_latency(sync_engine, stats: QueryStats):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        stats.record(time.perf_counter() - conn.info.pop("statement_start"))
+
+
+def apply_pragmas_on_connect(sync_engine, pragmas: dict):
+    @event.listens_for(sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def sqlite_engine(url: str, pragmas: dict = SQLITE_PRAGMAS, **kwargs):
+    """create_engine() for a SQLite URL that runs `pragmas` on every new connection."""
+    sqlite_engine = create_engine(url, **kwargs)
+    apply_pragmas_on_connect(sqlite_engine, pragmas)
+    return sqlite_engine
+
+
+def incremental_vacuum(conn, pages: int = 0):
+    """Return up to `pages` free pages of a SQLite database to the file system (0 = all).
+
+    The PRAGMA frees one page per step, and pysqlite's execute() steps it only
+    once; executescript() runs it to completion. It commits the connection's
+    open transaction first, so call it between transactions.
+    """
+    conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages})")
+
+
+def engine_options(url: str, kwargs: dict, read_only: bool = False) -> dict:
+    options = {"echo": DB_ECHO, **(READ_POOL_OPTIONS if read_only else POOL_OPTIONS), **kwargs}
+    if url.startswith("sqlite"):
+        if url.partition("://")[2] in ("", "/:memory:"):
+            # One in-memory database per connection: no pool to size
+            options = {k: v for k, v in options.items() if k not in POOL_OPTIONS}
+        options.setdefault("connect_args", {"check_same_thread": False})
+    elif read_only:
+        options.setdefault("connect_args", READ_ONLY_CONNECT_ARGS)
+    return options
+
+
+def make_engine(url: str, read_only: bool = False, **kwargs):
+    """New engine for `url` with the pool options: SQLite with the PRAGMA profile, or PostgreSQL.
+
+    read_only=True opens every connection in query-only mode, with the read pool sizes.
+    """
+    options = engine_options(url, kwargs, read_only)
+    if url.startswith("sqlite"):
+        new_engine = sqlite_engine(url, READ_ONLY_PRAGMAS if read_only else SQLITE_PRAGMAS, **options)
+    else:
+        new_engine = create_engine(url, **options)
+    track_latency(new_engine, QUERY_STATS["read" if read_only else "write"])
+    return new_engine
+
+
+def async_url(url: str) -> str:
+    """The same database through an asyncio driver: aiosqlite, or psycopg (3) for PostgreSQL."""
+    backend, _, rest = url.partition("://")
+    driver = "sqlite+aiosqlite" if backend.startswith("sqlite") else "postgresql+psycopg"
+    return f"{driver}://{rest}"
+
+
+def make_async_engine(url: str, **kwargs):
+    """Like make_engine(), for AsyncSession; `url` may name the sync driver."""
+    url = async_url(url)
+    async_engine = create_async_engine(url, **engine_options(url, kwargs))
+    if url.startswith("sqlite"):
+        apply_pragmas_on_connect(async_engine.sync_engine, SQLITE_PRAGMAS)
+    track_latency(async_engine.sync_engine, QUERY_STATS["write"])
+    return async_engine
+
+
+# --- Engine registry: one engine (and pool) per URL and options ---
+_engines = {}
+_async_engines = {}
+
+
+def get_engine(url: str = SQL_DB_URL, **kwargs):
+    """The process-wide engine for `url`, created on first use."""
+    key = (url, tuple(sorted(kwargs.items())))
+    if key not in _engines:
+        _engines[key] = make_engine(url, **kwargs)
+    return _engines[key]
+
+
+def get_async_engine(url: str = SQL_DB_URL, **kwargs):
+    """The process-wide async engine for `url`, created on first use."""
+    key = (async_url(url), tuple(sorted(kwargs.items())))
+    if key not in _async_engines:
+        _async_engines[key] = make_async_engine(url, **kwargs)
+    return _async_engines[key]
+
+
+def dispose_engines(close: bool = True):
+    """Drop every pooled connection of the sync engines: at shutdown, or with
+    close=False in a forked child, leaving the parent's connections open for it."""
+    for registered in _engines.values():
+        registered.dispose(close=close)
+
+
+# --- Per-user shards ---
+# Tables of one user's uploads; they go to the user's shard, everything else to the main database
+SHARDED_TABLES = {
+    "uploaded_files", "sales_records", "analytics_summary", "products", "regions",
+    "upload_batches", "upload_sessions", "upload_chunks",
+}
+SHARDING = SQLITE_SHARDS and SQL_DB_URL.startswith("sqlite")
+
+# User whose shard this request / job uses (None = main database)
+current_shard = ContextVar("current_shard", default=None)
+_shard_lock = threading.Lock()
+
+
+def shard_url(user_id: int) -> str:
+    return f"sqlite:///{os.path.join(SHARD_DIR, f'user_{user_id}.db')}"
+
+
+def shard_user_ids():
+    """Users that have a shard file (none when sharding is off)."""
+    if not SHARDING or not os.path.isdir(SHARD_DIR):
+        return []
+    return sorted(int(name[5:-3]) for name in os.listdir(SHARD_DIR)
+                  if name.startswith("user_") and name.endswith(".db") and name[5:-3].isdigit())
+
+
+def shard_engine(user_id: int, use_async: bool = False, read_only: bool = False):
+    """Engine of a user's shard; its schema is migrated the first time a process opens it."""
+    url = shard_url(user_id)
+    if (url, ()) not in _engines:
+        # Local import: the migrations module imports the models, which import this module
+        from apps.core.migrations import migrate
+        with _shard_lock:
+            if (url, ()) not in _engines:
+                os.makedirs(SHARD_DIR, exist_ok=True)
+                shard = make_engine(url)
+                migrate(shard)
+                _engines[(url, ())] = shard
+    if use_async:
+        return get_async_engine(url)
+    return get_engine(url, read_only=True) if read_only else get_engine(url)
+
+
+def set_user_shard(user_id: int):
+    """Route the rest of the current request (context) to `user_id`'s shard."""
+    if SHARDING:
+        current_shard.set(user_id)
+
+
+@contextmanager
+def user_shard(user_id: int):
+    """Route the sessions used inside the block to `user_id`'s shard (used by the worker)."""
+    token = current_shard.set(user_id if SHARDING else None)
+    try:
+        yield
+    finally:
+        current_shard.reset(token)
+
+
+def is_sharded(mapper=None, clause=None) -> bool:
+    if mapper is not None:
+        tables = inspect(mapper).tables
+    elif clause is not None:
+        tables = find_tables(clause, include_crud=True)
+    else:
+        return False
+    return any(table.name in SHARDED_TABLES for table in tables)
+
+
+class RoutingSession(Session):
+    """Session that runs statements on the per-user tables against current_shard's database."""
+    use_async_engines = False
+    read_only = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        user_id = current_shard.get()
+        if user_id is not None and is_sharded(mapper, clause):
+            shard = shard_engine(user_id, self.use_async_engines, self.read_only)
+            return shard.sync_engine if self.use_async_engines else shard
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+class AsyncRoutingSession(RoutingSession):
+    use_async_engines = True
+
+
+class ReadRoutingSession(RoutingSession):
+    """RoutingSession on the read-only engines (shards included)."""
+    read_only = True
+
 
 # --- SQLAlchemy engine və session ---
-engine = create_engine(SQL_DB_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # <-- düzgün ad
+engine = get_engine()
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)  # <-- düzgün ad
 Base = declarative_base()
 
-# --- SQLModel üçün engine ---
-# (Əgər sqlmodel istifadə edirsə)
-engine_sqlmodel = create_engine(SQL_DB_URL, echo=True)
+# --- Read-only engine and session (analytics and status reads, own pool) ---
+read_engine = get_engine(READ_DB_URL, read_only=True)
+ReadSessionLocal = sessionmaker(class_=ReadRoutingSession, autocommit=False, autoflush=False, bind=read_engine)
+
+# --- Async engine and session (for the async def endpoints) ---
+async_engine = get_async_engine()
+# Objects stay readable after commit: an AsyncSession cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, sync_session_class=AsyncRoutingSession,
+                                       autoflush=False, expire_on_commit=False)
 
 # DB session generator
 def get_session():
@@ -26,6 +311,30 @@ def get_session():
         db.close()
 
 
+async def get_async_session():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Read-only DB session: status and analytics reads, on their own pool so they never queue behind ingest
+def get_read_session():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def pool_metrics() -> dict:
+    """Statement latency and pool usage of the write and read engines, separately."""
+    pools = {"write": engine, "read": read_engine}
+    return {
+        kind: {**QUERY_STATS[kind].summary(), "pool": pool.pool.status()}
+        for kind, pool in pools.items()
+    }
+
+
+
 
 
 
@@ -0,0 +1,267 @@
+# apps/core/migrations.py
+
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+from apps.core.database import Base, engine, incremental_vacuum
+
+# Import every model so Base.metadata knows all tables
+from apps.models.user import User  # noqa: F401
+from apps.models.post import Post  # noqa: F401
+from apps.models.uploadedFile import FILE_KEY_SEQUENCE
+from apps.models.salesRecord import SalesRecord
+from apps.models.product import Product
+from apps.models.region import Region
+from apps.models.analyticsSummary import AnalyticsSummary
+from apps.models.refreshToken import RefreshToken  # noqa: F401
+from apps.models.ingestJob import IngestJob
+from apps.models.uploadSession import UploadSession
+from apps.models.uploadChunk import UploadChunk
+from apps.models.uploadBatch import UploadBatch
+from apps.service.dimensions import date_keys
+
+# Ordered list of schema changes; the position in the list is the version number.
+# Migrations must be idempotent: a fresh database gets the current models from the
+# baseline, so later steps have to skip whatever already exists.
+MIGRATIONS = []
+
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+
+# --- Helpers ---
+def has_column(conn, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def add_column(conn, table: str, column: str, ddl: str):
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_index(conn, name: str, table: str, columns: str):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def rebuild_sqlite_table(conn, table, select: str):
+    """Recreate `table` from its model and fill it with `select` (columns in model order)
+    over the old rows, table `{old}`; indexes are built after the copy.
+
+    For changes SQLite's ALTER TABLE cannot make, e.g. dropping a column named
+    in a FOREIGN KEY or UNIQUE constraint.
+    """
+    old = f"{table.name}_old"
+    conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old}"))
+    for index in inspect(conn).get_indexes(old):
+        conn.execute(text(f"DROP INDEX {index['name']}"))
+    conn.execute(CreateTable(table))
+    conn.execute(text(f"INSERT INTO {table.name} ({', '.join(table.c.keys())}) {select.format(old=old)}"))
+    conn.execute(text(f"DROP TABLE {old}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+@migration
+def baseline(conn):
+    Base.metadata.create_all(conn)
+
+
+@migration
+def upload_stream_stats(conn):
+    add_column(conn, "uploaded_files", "content_hash", "VARCHAR")
+    add_column(conn, "uploaded_files", "size_bytes", "INTEGER")
+    add_column(conn, "uploaded_files", "row_estimate", "INTEGER")
+
+
+@migration
+def upload_content_dedup(conn):
+    add_column(conn, "uploaded_files", "source_file_id", "VARCHAR REFERENCES uploaded_files (id)")
+    create_index(conn, "ix_uploaded_files_user_hash", "uploaded_files", "user_id, content_hash")
+
+
+@migration
+def ingest_job_queue(conn):
+    IngestJob.__table__.create(conn, checkfirst=True)
+
+
+@migration
+def upload_parquet_sidecar(conn):
+    add_column(conn, "uploaded_files", "parquet_path", "VARCHAR")
+
+
+@migration
+def sales_dimensions(conn):
+    Product.__table__.create(conn, checkfirst=True)
+    Region.__table__.create(conn, checkfirst=True)
+    if not has_column(conn, "sales_records", "product_name"):
+        return
+    add_column(conn, "sales_records", "date_key", "INTEGER")
+    add_column(conn, "sales_records", "product_id", "INTEGER REFERENCES products (id)")
+    add_column(conn, "sales_records", "region_id", "INTEGER REFERENCES regions (id)")
+    conn.execute(text("INSERT INTO products (name) SELECT DISTINCT product_name FROM sales_records "
+                      "WHERE product_name IS NOT NULL ON CONFLICT (name) DO NOTHING"))
+    conn.execute(text("INSERT INTO regions (name) SELECT DISTINCT region FROM sales_records "
+                      "WHERE region IS NOT NULL ON CONFLICT (name) DO NOTHING"))
+    conn.execute(text(
+        "UPDATE sales_records SET "
+        "product_id = (SELECT id FROM products WHERE products.name = sales_records.product_name), "
+        "region_id = (SELECT id FROM regions WHERE regions.name = sales_records.region)"
+    ))
+    # Dates go through the parser ingest uses, which accepts more than ISO dates
+    # (strftime() would give NULL for "09/05/2025"); each distinct value once
+    dates = [row[0] for row in conn.execute(text("SELECT DISTINCT date FROM sales_records WHERE date IS NOT NULL"))]
+    if dates:
+        keys = date_keys(dates)
+        conn.execute(text("UPDATE sales_records SET date_key = :key WHERE date = :date"),
+                     [{"key": int(key) or None, "date": value} for value, key in zip(dates, keys)])
+    for column in ("date", "product_name", "region"):
+        conn.execute(text(f"ALTER TABLE sales_records DROP COLUMN {column}"))
+    # Sidecars written before this stored dates as text; answer from SQL until re-ingested
+    conn.execute(text("UPDATE uploaded_files SET parquet_path = NULL"))
+
+
+@migration
+def upload_ingest_progress(conn):
+    add_column(conn, "uploaded_files", "rows_parsed", "INTEGER")
+    add_column(conn, "uploaded_files", "rows_inserted", "INTEGER")
+    add_column(conn, "uploaded_files", "rows_rejected", "INTEGER")
+    add_column(conn, "uploaded_files", "bytes_read", "INTEGER")
+    add_column(conn, "uploaded_files", "stage_timings", "JSON")
+    add_column(conn, "uploaded_files", "rows_per_sec", "FLOAT")
+
+
+@migration
+def resumable_uploads(conn):
+    UploadSession.__table__.create(conn, checkfirst=True)
+    UploadChunk.__table__.create(conn, checkfirst=True)
+
+
+@migration
+def upload_batches(conn):
+    UploadBatch.__table__.create(conn, checkfirst=True)
+    add_column(conn, "uploaded_files", "batch_id", "VARCHAR REFERENCES upload_batches (id)")
+    add_column(conn, "ingest_jobs", "batch_id", "VARCHAR REFERENCES upload_batches (id)")
+    create_index(conn, "ix_ingest_jobs_batch_id", "ingest_jobs", "batch_id")
+
+
+@migration
+def upload_rejected_rows(conn):
+    add_column(conn, "uploaded_files", "rejection_counts", "JSON")
+    add_column(conn, "uploaded_files", "rejected_path", "VARCHAR")
+
+
+@migration
+def sales_record_indexes(conn):
+    if not has_column(conn, "sales_records", "uploaded_file_id"):
+        # Created with the model (keyed by file_key since upload_file_keys)
+        return
+    create_index(conn, "ix_sales_records_file_product", "sales_records",
+                 "uploaded_file_id, product_id, date_key, region_id, quantity, price")
+    create_index(conn, "ix_sales_records_file_region", "sales_records",
+                 "uploaded_file_id, region_id, date_key, product_id, quantity, price")
+    conn.execute(text("ANALYZE sales_records"))
+
+
+@migration
+def ingest_job_owner(conn):
+    # Owner of the queued file or batch: the worker opens that user's shard
+    add_column(conn, "ingest_jobs", "user_id", "INTEGER REFERENCES users (id)")
+
+
+@migration
+def upload_file_keys(conn):
+    # sales_records and analytics_summary reference uploads by the integer
+    # uploaded_files.file_key instead of repeating the 36-character UUID
+    if not has_column(conn, "uploaded_files", "file_key"):
+        add_column(conn, "uploaded_files", "file_key", "INTEGER")
+        ids = [row[0] for row in conn.execute(text("SELECT id FROM uploaded_files ORDER BY uploaded_at, id"))]
+        if ids:
+            conn.execute(text("UPDATE uploaded_files SET file_key = :key WHERE id = :id"),
+                         [{"key": key, "id": file_id} for key, file_id in enumerate(ids, start=1)])
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_uploaded_files_file_key ON uploaded_files (file_key)"))
+    if conn.dialect.name == "postgresql":
+        FILE_KEY_SEQUENCE.create(conn, checkfirst=True)
+        conn.execute(text("SELECT setval('uploaded_files_file_key_seq', "
+                          "(SELECT coalesce(max(file_key), 0) + 1 FROM uploaded_files), false)"))
+
+    key_of = "(SELECT file_key FROM uploaded_files WHERE uploaded_files.id = {old}.uploaded_file_id)"
+    for table in (SalesRecord.__table__, AnalyticsSummary.__table__):
+        if not has_column(conn, table.name, "uploaded_file_id"):
+            continue
+        if conn.dialect.name == "sqlite":
+            values = ", ".join(key_of if column == "file_key" else column for column in table.c.keys())
+            rebuild_sqlite_table(conn, table, f"SELECT {values} FROM {{old}}")
+        else:
+            unique = " UNIQUE" if table.c.file_key.unique else ""
+            add_column(conn, table.name, "file_key", f"INTEGER{unique} REFERENCES uploaded_files (file_key)")
+            conn.execute(text(f"UPDATE {table.name} SET file_key = {key_of.format(old=table.name)}"))
+            # Also drops the indexes on the column
+            conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN uploaded_file_id"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    # The space of the dropped UUIDs is given back by migrate(), after the commit
+    conn.execute(text("ANALYZE sales_records"))
+
+
+@migration
+def upload_chunk_digests(conn):
+    # Hash blocks digested as each resumable chunk arrives, combined at finalize
+    add_column(conn, "upload_chunks", "first_block", "INTEGER")
+    add_column(conn, "upload_chunks", "block_digests", "VARCHAR")
+
+
+@migration
+def upload_deletion_claims(conn):
+    add_column(conn, "uploaded_files", "deletion_token", "VARCHAR")
+    add_column(conn, "uploaded_files", "deletion_lease_expires_at", "TIMESTAMP")
+
+
+@migration
+def file_key_counter(conn):
+    # SQLite: see next_file_key. file_keys holds no rows; inserting a key only
+    # raises the table's sqlite_sequence entry, which never goes down
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text("CREATE TABLE IF NOT EXISTS file_keys (file_key INTEGER PRIMARY KEY AUTOINCREMENT)"))
+    conn.execute(text("INSERT INTO file_keys (file_key) SELECT max(file_key) FROM uploaded_files "
+                      "HAVING max(file_key) IS NOT NULL"))
+    conn.execute(text("DELETE FROM file_keys"))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS uploaded_files_file_key AFTER INSERT ON uploaded_files "
+        "WHEN NEW.file_key IS NOT NULL BEGIN "
+        "INSERT INTO file_keys (file_key) VALUES (NEW.file_key); DELETE FROM file_keys; "
+        "END"
+    ))
+
+
+def migrate(bind=engine):
+    """Apply all pending migrations, each in its own transaction.
+
+    On SQLite with auto_vacuum=INCREMENTAL, the pages the migrations freed
+    (dropped columns and tables) are then returned to the file system.
+    """
+    with bind.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version INTEGER PRIMARY KEY, name VARCHAR, applied_at TIMESTAMP)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    pending = [(version, fn) for version, fn in enumerate(MIGRATIONS, start=1) if version not in applied]
+    for version, fn in pending:
+        with bind.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": fn.__name__, "t": datetime.utcnow()},
+            )
+
+    if pending and bind.dialect.name == "sqlite":
+        # Outside any transaction: incremental_vacuum() commits the open one
+        with bind.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+                incremental_vacuum(conn)
@@ -1,38 +1,52 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, BackgroundTasks
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session, joinedload
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request
+from typing import List
+from fastapi.responses import FileResponse
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from passlib.context import CryptContext
-from jose import JWTError, jwt
 from pathlib import Path
-import shutil, uuid, secrets
-import pandas as pd
+import uuid, secrets
+import anyio
 from datetime import datetime, timedelta
 
-from apps.core.database import SessionLocal, get_session
+from apps.core.config import MAX_UPLOAD_BYTES, BATCH_MAX_FILES, RESUMABLE_CHUNK_SIZE, RESUMABLE_MAX_CHUNK_SIZE
+from apps.core.database import (
+    SessionLocal, get_async_session, get_read_session, pool_metrics,
+)
+from apps.core.migrations import migrate
 from apps.models.user import User
 from apps.models.post import Post
 from apps.models.uploadedFile import UploadedFile
-from apps.models.salesRecord import SalesRecord
 from apps.models.analyticsSummary import AnalyticsSummary
 from apps.models.refreshToken import RefreshToken
+from apps.models.uploadSession import UploadSession
+from apps.models.uploadChunk import UploadChunk
+from apps.models.uploadBatch import UploadBatch
 from apps.api.schemas.schemas import UserCreate, UserResponse, PostCreate, PostResponse, UploadedFileResponse
-from apps.api.routers.auth import verify_password, create_access_token, SECRET_KEY, ALGORITHM
+from apps.api.schemas.schemas import ResumableUploadCreate, ResumableUploadResponse, UploadBatchResponse
+from apps.api.schemas.schemas import FileAnalyticsResponse
+from apps.api.routers.auth import verify_password, create_access_token, get_current_user
+from apps.api.routers import analytics
+from apps.service.jobs import enqueue, enqueue_batch
+from apps.service.uploads import save_upload, save_stream, UploadTooLarge
+from apps.service import resumable
+from apps.service.retention import mark_for_deletion
+from apps.service.compression import UPLOAD_SUFFIXES
 
 # FastAPI app
 app = FastAPI()
 UPLOAD_FOLDER = Path("../uploads")
 UPLOAD_FOLDER.mkdir(exist_ok=True)
+UNSUPPORTED_FILE_TYPE = "Only CSV or Excel files are allowed (CSV may be .gz, .zst or .zip compressed)"
+
+# Bring the database schema up to date
+migrate()
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# OAuth2
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
-
-# Required columns for analytics
-REQUIRED_COLUMNS = ["date", "product_name", "quantity", "price", "region"]
-
-
 # DB dependency
 def get_db():
     db = SessionLocal()
@@ -42,21 +56,9 @@ def get_db():
         db.close()
 
 
-# Current user dependency
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user_id = int(user_id)
-    except (JWTError, ValueError):
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+# Async DB dependency: for the async def endpoints, whose queries must not block the event loop.
+# The same one get_current_user uses, so a request shares one session
+get_async_db = get_async_session
 
 
 # --- Password hashing ---
@@ -77,15 +79,16 @@ def create_refresh_token(user_id: int, db: Session):
 
 # --- User Endpoints ---
 @app.post("/users/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.name == user.name).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.name == user.name))
     if db_user:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed_pw = hash_password(user.password)
+    # bcrypt is deliberately slow: hash off the event loop
+    hashed_pw = await anyio.to_thread.run_sync(hash_password, user.password)
     new_user = User(name=user.name, age=user.age, password=hashed_pw)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
@@ -116,20 +119,19 @@ async def read_current_user(current_user: User = Depends(get_current_user)):
 
 # --- Posts Endpoints ---
 @app.post("/create-post/", response_model=PostResponse)
-async def create_post(post: PostCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.id == post.author_id).first()
+async def create_post(post: PostCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.get(User, post.author_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    db_post = Post(title=post.title, body=post.body, author_id=post.author_id)
+    db_post = Post(title=post.title, body=post.body, author_id=post.author_id, author=db_user)
     db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    await db.commit()
     return db_post
 
 
 @app.get("/read-one-post/{post_id}", response_model=PostResponse)
-async def read_post(post_id: int, db: Session = Depends(get_db)):
-    post = db.query(Post).options(joinedload(Post.author)).filter(Post.id == post_id).first()
+async def read_post(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    post = await db.scalar(select(Post).options(joinedload(Post.author)).where(Post.id == post_id))
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     return post
@@ -138,98 +140,255 @@ async def read_post(post_id: int, db: Session = Depends(get_db)):
 # --- File Upload ---
 @app.post("/files/upload", response_model=UploadedFileResponse)
 async def upload_file(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
-    if not file.filename.endswith((".csv", ".xlsx")):
-        raise HTTPException(status_code=400, detail="Only CSV or Excel files are allowed")
+    if not file.filename.endswith(UPLOAD_SUFFIXES):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_TYPE)
+    # Reject obviously oversized bodies before reading them (64 KiB allowance for multipart framing)
+    content_length = int(request.headers.get("content-length") or 0)
+    if MAX_UPLOAD_BYTES and content_length > MAX_UPLOAD_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail="File is too large")
     file_id = str(uuid.uuid4())
     file_path = UPLOAD_FOLDER / f"{file_id}_{file.filename}"
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    try:
+        stats = await save_upload(file, file_path)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return await register_upload(db, file_id, file.filename, file_path, current_user.id, stats)
+
+
+# The request body is the file itself: it goes to disk as it arrives, without
+# being spooled first, and the size limit applies while it streams
+@app.put("/files/upload/{filename}", response_model=UploadedFileResponse)
+async def upload_file_raw(
+    filename: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    if not filename.endswith(UPLOAD_SUFFIXES):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_TYPE)
+    content_length = int(request.headers.get("content-length") or 0)
+    if MAX_UPLOAD_BYTES and content_length > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File is too large")
+    file_id = str(uuid.uuid4())
+    file_path = UPLOAD_FOLDER / f"{file_id}_{filename}"
+    try:
+        stats = await save_stream(request.stream(), file_path)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return await register_upload(db, file_id, filename, file_path, current_user.id, stats)
+
+
+async def register_upload(db: AsyncSession, file_id: str, filename: str, file_path: Path, user_id: int, stats):
+    """Record a file that is fully on disk and queue it for ingestion (or reuse an identical one)."""
+    uploaded_file = await add_upload(db, file_id, filename, file_path, user_id, stats)
+    if uploaded_file.status != "done":
+        # Ingested by the worker pool (python -m apps.worker), not in the API process
+        enqueue(db, uploaded_file.id, user_id)
+    await db.commit()
+    await db.refresh(uploaded_file)
+    return uploaded_file
+
+
+async def add_upload(db: AsyncSession, file_id: str, filename: str, file_path: Path, user_id: int, stats):
     uploaded_file = UploadedFile(
         id=file_id,
-        filename=file.filename,
+        filename=filename,
         filepath=str(file_path),
         status="pending",
-        user_id=current_user.id
+        user_id=user_id,
+        content_hash=stats.content_hash,
+        size_bytes=stats.size_bytes,
+        row_estimate=stats.row_estimate(filename)
     )
+
+    # Byte-identical re-upload: reuse the rows and summary that were already ingested
+    source = await find_ingested_copy(db, user_id, stats.content_hash)
+    if source:
+        file_path.unlink(missing_ok=True)
+        uploaded_file.filepath = source.filepath
+        uploaded_file.source_file_id = source.id
+        uploaded_file.status = "done"
     db.add(uploaded_file)
-    db.commit()
-    db.refresh(uploaded_file)
-    background_tasks.add_task(process_file, uploaded_file.id)
     return uploaded_file
 
 
-def process_file(file_id: str):
-    db = SessionLocal()
+async def find_ingested_copy(db: AsyncSession, user_id: int, content_hash: str):
+    return await db.scalar(select(UploadedFile).where(
+        UploadedFile.user_id == user_id,
+        UploadedFile.content_hash == content_hash,
+        UploadedFile.source_file_id.is_(None),
+        UploadedFile.status == "done"
+    ).limit(1))
+
+
+# --- Batch Upload ---
+@app.post("/files/upload/batch", response_model=UploadBatchResponse)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+    if not all(file.filename.endswith(UPLOAD_SUFFIXES) for file in files):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_TYPE)
+
+    saved = []
     try:
-        uploaded_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
-        if not uploaded_file:
-            return
-        uploaded_file.status = "processing"
-        db.commit()
-
-        if uploaded_file.filename.endswith(".csv"):
-            df = pd.read_csv(uploaded_file.filepath)
-        else:
-            df = pd.read_excel(uploaded_file.filepath)
-
-        missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-        if missing_cols:
-            uploaded_file.status = "failed"
-            uploaded_file.error_message = f"Missing columns: {missing_cols}"
-            db.commit()
-            return
-
-        df = df.dropna(subset=REQUIRED_COLUMNS)
-        df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce")
-        df["price"] = pd.to_numeric(df["price"], errors="coerce")
-        df = df.dropna(subset=["quantity", "price"])
-
-        sales_records = [
-            SalesRecord(
-                uploaded_file_id=file_id,
-                date=row["date"],
-                product_name=row["product_name"],
-                quantity=row["quantity"],
-                price=row["price"],
-                region=row["region"]
-            ) for _, row in df.iterrows()
-        ]
-        db.bulk_save_objects(sales_records)
-        db.commit()
-
-        total_sales_product = df.groupby("product_name").apply(lambda x: (x.quantity * x.price).sum()).to_dict()
-        total_sales_region = df.groupby("region").apply(lambda x: (x.quantity * x.price).sum()).to_dict()
-        df["month"] = pd.to_datetime(df["date"]).dt.to_period("M")
-        monthly_trends = df.groupby("month").apply(lambda x: (x.quantity * x.price).sum()).to_dict()
-        monthly_trends = {str(k): v for k, v in monthly_trends.items()}
-
-        analytics = AnalyticsSummary(
-            uploaded_file_id=file_id,
-            total_sales_product=total_sales_product,
-            total_sales_region=total_sales_region,
-            monthly_trends=monthly_trends
-        )
-        db.add(analytics)
-        uploaded_file.status = "done"
-        db.commit()
+        for file in files:
+            file_id = str(uuid.uuid4())
+            file_path = UPLOAD_FOLDER / f"{file_id}_{file.filename}"
+            saved.append((file_id, file.filename, file_path, await save_upload(file, file_path)))
+    except BaseException as e:
+        for _, _, file_path, _ in saved:
+            file_path.unlink(missing_ok=True)
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise
+
+    # All files, the batch and its single ingest job go in one commit
+    batch = UploadBatch(id=str(uuid.uuid4()), user_id=current_user.id, status="pending", file_count=len(saved))
+    db.add(batch)
+    for file_id, filename, file_path, stats in saved:
+        (await add_upload(db, file_id, filename, file_path, current_user.id, stats)).batch_id = batch.id
+    enqueue_batch(db, batch.id, current_user.id)
+    await db.commit()
+    await db.refresh(batch, ["files"])
+    return batch
+
+
+@app.get("/files/batches/{batch_id}", response_model=UploadBatchResponse)
+def get_batch(batch_id: str, db: Session = Depends(get_read_session), current_user=Depends(get_current_user)):
+    batch = db.query(UploadBatch).filter(
+        UploadBatch.id == batch_id, UploadBatch.user_id == current_user.id
+    ).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+# --- Resumable Upload ---
+async def get_upload_session(db: AsyncSession, upload_id: str, user_id: int) -> UploadSession:
+    session = await db.scalar(select(UploadSession).options(selectinload(UploadSession.chunks)).where(
+        UploadSession.id == upload_id, UploadSession.user_id == user_id
+    ))
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+def upload_session_response(session: UploadSession):
+    return ResumableUploadResponse(
+        id=session.id,
+        filename=session.filename,
+        size_bytes=session.size_bytes,
+        chunk_size=session.chunk_size,
+        total_chunks=session.total_chunks,
+        status=session.status,
+        received_chunks=sorted(c.index for c in session.chunks),
+        uploaded_file_id=session.uploaded_file_id
+    )
 
-    except Exception as e:
-        uploaded_file.status = "failed"
-        uploaded_file.error_message = str(e)
-        db.commit()
-        print(f"Error processing file {file_id}: {e}")
-    finally:
-        db.close()
+
+@app.post("/files/uploads", response_model=ResumableUploadResponse)
+async def initiate_upload(data: ResumableUploadCreate, db: AsyncSession = Depends(get_async_db),
+                          current_user=Depends(get_current_user)):
+    if not data.filename.endswith(UPLOAD_SUFFIXES):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_TYPE)
+    if MAX_UPLOAD_BYTES and data.size_bytes > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File is too large")
+    chunk_size = data.chunk_size or RESUMABLE_CHUNK_SIZE
+    if data.size_bytes <= 0 or not 0 < chunk_size <= RESUMABLE_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail="Invalid file or chunk size")
+
+    upload_id = str(uuid.uuid4())
+    file_path = UPLOAD_FOLDER / f"{upload_id}_{data.filename}.part"
+    await anyio.to_thread.run_sync(resumable.preallocate, file_path, data.size_bytes)
+    session = UploadSession(
+        id=upload_id,
+        user_id=current_user.id,
+        filename=data.filename,
+        filepath=str(file_path),
+        size_bytes=data.size_bytes,
+        chunk_size=chunk_size,
+        total_chunks=resumable.total_chunks(data.size_bytes, chunk_size),
+        status="open",
+        chunks=[]
+    )
+    db.add(session)
+    await db.commit()
+    return upload_session_response(session)
+
+
+@app.get("/files/uploads/{upload_id}", response_model=ResumableUploadResponse)
+async def get_upload(upload_id: str, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    # Lists the chunks already received, so an interrupted client sends only the rest
+    return upload_session_response(await get_upload_session(db, upload_id, current_user.id))
+
+
+@app.put("/files/uploads/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    session = await get_upload_session(db, upload_id, current_user.id)
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail="Upload is already complete")
+    if not 0 <= index < session.total_chunks:
+        raise HTTPException(status_code=400, detail="Invalid chunk index")
+
+    offset = index * session.chunk_size
+    expected = resumable.expected_chunk_size(index, session.size_bytes, session.chunk_size)
+    try:
+        stats = await resumable.write_chunk(request.stream(), Path(session.filepath), offset, expected)
+    except resumable.ChunkError as e:
+        # Part of the chunk may have been overwritten: it has to be sent again
+        await db.execute(delete(UploadChunk).where(UploadChunk.upload_id == upload_id, UploadChunk.index == index))
+        await db.commit()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Sending a chunk again replaces its record
+    first_block, block_digests = resumable.chunk_digests(stats, session.size_bytes)
+    await db.merge(UploadChunk(upload_id=upload_id, index=index, size_bytes=stats.size_bytes,
+                               newlines=stats.newlines, ends_with_newline=stats.ends_with_newline,
+                               first_block=first_block, block_digests=block_digests))
+    await db.commit()
+    return {"index": index, "size_bytes": stats.size_bytes}
+
+
+@app.post("/files/uploads/{upload_id}/complete", response_model=UploadedFileResponse)
+async def complete_upload(upload_id: str, db: AsyncSession = Depends(get_async_db),
+                          current_user=Depends(get_current_user)):
+    session = await get_upload_session(db, upload_id, current_user.id)
+    if session.status == "complete":
+        return await db.get(UploadedFile, session.uploaded_file_id)
+    missing = sorted(set(range(session.total_chunks)) - {c.index for c in session.chunks})
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Missing chunks: {missing[:20]}")
+
+    part_path = Path(session.filepath)
+    stats = await anyio.to_thread.run_sync(resumable.assembled_stats, part_path, list(session.chunks),
+                                           session.size_bytes)
+    # The chunks were written in place; the finished file only needs its final name
+    file_path = UPLOAD_FOLDER / f"{upload_id}_{session.filename}"
+    part_path.rename(file_path)
+    session.status = "complete"
+    session.filepath = str(file_path)
+    session.uploaded_file_id = upload_id
+    return await register_upload(db, upload_id, session.filename, file_path, current_user.id, stats)
 
 
 # --- File Status & Analytics ---
 @app.get("/files/{file_id}/status", response_model=UploadedFileResponse)
-def file_status(file_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def file_status(file_id: str, db: Session = Depends(get_read_session), current_user=Depends(get_current_user)):
     uploaded_file = db.query(UploadedFile).filter(
         UploadedFile.id == file_id, UploadedFile.user_id == current_user.id
     ).first()
@@ -238,8 +397,23 @@ def file_status(file_id: str, db: Session = Depends(get_db), current_user=Depend
     return uploaded_file
 
 
-@app.get("/files/{file_id}/analytics")
-def get_file_analytics(file_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@app.get("/files/{file_id}/rejected")
+def get_rejected_rows(file_id: str, db: Session = Depends(get_read_session), current_user=Depends(get_current_user)):
+    # Parquet file with the rows that failed validation: row number, values as read, reason
+    uploaded_file = db.query(UploadedFile).filter(
+        UploadedFile.id == file_id, UploadedFile.user_id == current_user.id
+    ).first()
+    if not uploaded_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    source = db.query(UploadedFile).filter(UploadedFile.id == uploaded_file.data_file_id).first()
+    if not source.rejected_path or not Path(source.rejected_path).exists():
+        raise HTTPException(status_code=404, detail="No rejected rows")
+    return FileResponse(source.rejected_path, media_type="application/vnd.apache.parquet",
+                        filename=f"{Path(uploaded_file.filename).stem}.rejected.parquet")
+
+
+@app.get("/files/{file_id}/analytics", response_model=FileAnalyticsResponse)
+def get_file_analytics(file_id: str, db: Session = Depends(get_read_session), current_user=Depends(get_current_user)):
     uploaded_file = db.query(UploadedFile).filter(
         UploadedFile.id == file_id, UploadedFile.user_id == current_user.id
     ).first()
@@ -247,13 +421,49 @@ def get_file_analytics(file_id: str, db: Session = Depends(get_db), current_user
         raise HTTPException(status_code=404, detail="File not found")
 
     analytics = db.query(AnalyticsSummary).filter(
-        AnalyticsSummary.uploaded_file_id == file_id
+        AnalyticsSummary.file_key == uploaded_file.data_file_key
     ).first()
 
     if not analytics:
         raise HTTPException(status_code=404, detail="Analytics not found")
 
-    return analytics
+    # A dedup copy shares its source's summary but is reported under its own id
+    return FileAnalyticsResponse(
+        id=analytics.id,
+        uploaded_file_id=uploaded_file.id,
+        total_sales_product=analytics.total_sales_product,
+        total_sales_region=analytics.total_sales_region,
+        monthly_trends=analytics.monthly_trends,
+    )
+
+
+@app.get("/metrics/db")
+def db_metrics(current_user=Depends(get_current_user)):
+    # Statement latency percentiles and pool usage, write path and read-only pool reported separately
+    return pool_metrics()
+
+
+# --- File Deletion ---
+@app.delete("/files/{file_id}", response_model=UploadedFileResponse, status_code=202)
+def delete_file(
+    file_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    uploaded_file = db.query(UploadedFile).filter(
+        UploadedFile.id == file_id, UploadedFile.user_id == current_user.id
+    ).first()
+    if not uploaded_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not mark_for_deletion(db, uploaded_file):
+        raise HTTPException(status_code=409, detail="File is still being ingested")
+    # The worker pool deletes the rows in batches (see apps/worker.py)
+    db.refresh(uploaded_file)
+    return uploaded_file
+
+
+# --- Analytics router ---
+app.include_router(analytics.router)
 
 
 
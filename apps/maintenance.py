@@ -0,0 +1,59 @@
+# apps/maintenance.py
+#
+# Maintenance commands, run by hand (see the Makefile), not at startup:
+#
+#   python -m apps.maintenance auto-vacuum
+#
+# auto-vacuum: new SQLite files get SQLITE_AUTO_VACUUM from the PRAGMA profile,
+# but a file created before keeps its old mode until it is rewritten with a full
+# VACUUM. Until then a purge cannot give freed pages back to the file system
+# (reclaim_free_pages does nothing) and the file keeps its size. The VACUUM holds
+# the write lock for the whole rewrite and needs free disk space about the size
+# of the file, so stop the app and the workers first. Covers the main database
+# and every user shard; files already in the configured mode are skipped.
+
+import argparse
+
+from apps.core.config import SQLITE_AUTO_VACUUM
+from apps.core.database import engine as main_engine, shard_engine, shard_user_ids
+from apps.core.migrations import migrate
+
+AUTO_VACUUM_MODES = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}
+
+
+def switch_auto_vacuum(engine, mode: str = SQLITE_AUTO_VACUUM) -> bool:
+    """Rewrite a SQLite database in auto_vacuum `mode`; False if it is not SQLite or already in that mode."""
+    if engine.dialect.name != "sqlite":
+        return False
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == AUTO_VACUUM_MODES[mode.upper()]:
+            return False
+        conn.exec_driver_sql(f"PRAGMA auto_vacuum = {mode.upper()}")
+        conn.exec_driver_sql("VACUUM")
+    return True
+
+
+def auto_vacuum():
+    migrate()
+    engines = [("main database", main_engine)]
+    engines += [(f"shard of user {user_id}", shard_engine(user_id)) for user_id in shard_user_ids()]
+    for name, engine in engines:
+        if switch_auto_vacuum(engine):
+            print(f"{name}: switched to auto_vacuum={SQLITE_AUTO_VACUUM.upper()}")
+        else:
+            print(f"{name}: nothing to do")
+
+
+COMMANDS = {"auto-vacuum": auto_vacuum}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m apps.maintenance")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
+from apps.core.database import Base
+from datetime import datetime
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (Index("ix_ingest_jobs_status_available", "status", "available_at"),)
+    id = Column(Integer, primary_key=True)
+    uploaded_file_id = Column(String, ForeignKey("uploaded_files.id"), unique=True)
+    batch_id = Column(String, ForeignKey("upload_batches.id"), nullable=True, index=True)  # set instead of uploaded_file_id
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # owner: selects the shard (SQLITE_SHARDS)
+    status = Column(String, default="queued")  # queued / running / done / failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    lease_token = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Many-to-one only: orders the job INSERT after its file / batch in the same flush
+    uploaded_file = relationship("UploadedFile")
+    batch = relationship("UploadBatch")
@@ -0,0 +1,7 @@
+from sqlalchemy import Column, Integer, String
+from apps.core.database import Base
+
+class Product(Base):
+    __tablename__ = "products"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
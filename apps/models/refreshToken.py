@@ -1,8 +1,9 @@
-from sqlmodel import SQLModel, Field, Column, String, DateTime
-from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from apps.core.database import Base
 
-class RefreshToken(SQLModel, table=True):
-    id: int = Field(default=None, primary_key=True)
-    user_id: int
-    token: str = Field(sa_column=Column(String, unique=True))
-    expires_at: datetime
+class RefreshToken(Base):
+    __tablename__ = "refreshtoken"  # name the table had as a SQLModel model
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    token = Column(String, unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
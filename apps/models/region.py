@@ -0,0 +1,7 @@
+from sqlalchemy import Column, Integer, String
+from apps.core.database import Base
+
+class Region(Base):
+    __tablename__ = "regions"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
@@ -1,15 +1,26 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float
+from sqlalchemy import Column, Integer, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from apps.core.database import Base
 
 class SalesRecord(Base):
     __tablename__ = 'sales_records'
+    # Every analytics query filters on file_key and groups or filters by
+    # product or region; date_key comes next for the date-range filters. Both
+    # indexes carry the remaining columns too, so the queries never read the
+    # table itself (monthly trends scan the file's slice of either index).
+    __table_args__ = (
+        Index('ix_sales_records_file_product', 'file_key', 'product_id', 'date_key', 'region_id', 'quantity', 'price'),
+        Index('ix_sales_records_file_region', 'file_key', 'region_id', 'date_key', 'product_id', 'quantity', 'price'),
+    )
     id = Column(Integer, primary_key=True)
-    uploaded_file_id = Column(String, ForeignKey('uploaded_files.id'))
-    date = Column(String)
-    product_name = Column(String)
+    # The upload's integer key, not its UUID: 36 bytes less in every row and index entry
+    file_key = Column(Integer, ForeignKey('uploaded_files.file_key'))
+    date_key = Column(Integer)  # sale day as yyyymmdd, e.g. 20250901
+    product_id = Column(Integer, ForeignKey('products.id'))
     quantity = Column(Float)
     price = Column(Float)
-    region = Column(String)
+    region_id = Column(Integer, ForeignKey('regions.id'))
 
-    uploaded_file = relationship("UploadedFile", back_populates="sales_records")
\ No newline at end of file
+    uploaded_file = relationship("UploadedFile", back_populates="sales_records")
+    product = relationship("Product")
+    region = relationship("Region")
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from sqlalchemy.orm import relationship
+from apps.core.database import Base
+from datetime import datetime
+
+class UploadBatch(Base):
+    __tablename__ = "upload_batches"
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    status = Column(String, default="pending")  # pending / processing / done / failed
+    error_message = Column(String, nullable=True)
+    file_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    # Totals over every successfully ingested file of the batch (same shape as AnalyticsSummary)
+    total_sales_product = Column(JSON, nullable=True)
+    total_sales_region = Column(JSON, nullable=True)
+    monthly_trends = Column(JSON, nullable=True)
+
+    files = relationship("UploadedFile", back_populates="batch", order_by="UploadedFile.filename")
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy.orm import relationship
+from apps.core.database import Base
+from datetime import datetime
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+    upload_id = Column(String, ForeignKey("upload_sessions.id"), primary_key=True)
+    index = Column(Integer, primary_key=True)
+    size_bytes = Column(Integer)
+    newlines = Column(Integer)
+    ends_with_newline = Column(Boolean)
+    # SHA-256 of the hash blocks that start in this chunk (see UploadStats): hex digests of
+    # blocks first_block, first_block + 1, ... concatenated
+    first_block = Column(Integer, nullable=True)
+    block_digests = Column(String, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+
+    session = relationship("UploadSession", back_populates="chunks")
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy.orm import relationship
+from apps.core.database import Base
+from datetime import datetime
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    filename = Column(String)
+    filepath = Column(String)  # preallocated file the chunks are written into
+    size_bytes = Column(Integer)
+    chunk_size = Column(Integer)
+    total_chunks = Column(Integer)
+    status = Column(String, default="open")  # open / complete
+    created_at = Column(DateTime, default=datetime.utcnow)
+    uploaded_file_id = Column(String, ForeignKey("uploaded_files.id"), nullable=True)
+
+    chunks = relationship("UploadChunk", back_populates="session", cascade="all, delete-orphan")
+    uploaded_file = relationship("UploadedFile")
@@ -1,18 +1,83 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, Float, JSON, Sequence
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.functions import FunctionElement
 from apps.core.database import Base
 from datetime import datetime
 
+# PostgreSQL hands out file keys from a sequence. SQLite keeps the highest key ever
+# used as the sqlite_sequence entry of the AUTOINCREMENT table file_keys, raised by
+# a trigger on every new upload (see the file_key_counter migration), so the key of
+# a deleted upload is never handed out again
+FILE_KEY_SEQUENCE = Sequence("uploaded_files_file_key_seq", metadata=Base.metadata)
+
+
+class next_file_key(FunctionElement):
+    """The next UploadedFile.file_key, computed by the database in the INSERT."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(next_file_key)
+def _next_file_key(element, compiler, **kw):
+    return "(SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'file_keys'), 0) + 1)"
+
+
+@compiles(next_file_key, "postgresql")
+def _next_file_key_postgresql(element, compiler, **kw):
+    return compiler.process(FILE_KEY_SEQUENCE.next_value(), **kw)
+
+
 class UploadedFile(Base):
     __tablename__ = "uploaded_files"
+    __table_args__ = (
+        Index("ix_uploaded_files_user_hash", "user_id", "content_hash"),
+        Index("ux_uploaded_files_file_key", "file_key", unique=True),
+    )
+    # One INSERT per new upload: a multi-row INSERT would read the counter only once
+    __mapper_args__ = {"eager_defaults": False}
+    # Public id (API, files, jobs); file_key is the compact internal key that
+    # sales_records and analytics_summary store instead
     id = Column(String, primary_key=True, index=True)
+    file_key = Column(Integer, default=next_file_key())
     filename = Column(String)
     filepath = Column(String)
     status = Column(String, default="pending")
     error_message = Column(String, nullable=True)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
+    content_hash = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    row_estimate = Column(Integer, nullable=True)
+    # Set when this upload is a byte-identical copy of an earlier one; rows and summary live there
+    source_file_id = Column(String, ForeignKey("uploaded_files.id"), nullable=True)
+    parquet_path = Column(String, nullable=True)
+    batch_id = Column(String, ForeignKey("upload_batches.id"), nullable=True)
+    # Ingest progress, updated after every committed chunk
+    rows_parsed = Column(Integer, nullable=True)
+    rows_inserted = Column(Integer, nullable=True)
+    rows_rejected = Column(Integer, nullable=True)
+    bytes_read = Column(Integer, nullable=True)
+    stage_timings = Column(JSON, nullable=True)  # seconds per stage: parse, clean, insert, ...
+    rows_per_sec = Column(Float, nullable=True)
+    # Validation: rows failing each rule, and the Parquet file listing the rejected rows
+    rejection_counts = Column(JSON, nullable=True)
+    rejected_path = Column(String, nullable=True)
+    # Claim of the process deleting the upload (status "deleting"), see apps/service/retention.py
+    deletion_token = Column(String, nullable=True)
+    deletion_lease_expires_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="uploaded_files")
     sales_records = relationship("SalesRecord", back_populates="uploaded_file")
-    analytics_summary = relationship("AnalyticsSummary", back_populates="uploaded_file", uselist=False)
\ No newline at end of file
+    analytics_summary = relationship("AnalyticsSummary", back_populates="uploaded_file", uselist=False)
+    batch = relationship("UploadBatch", back_populates="files")
+    source = relationship("UploadedFile", remote_side=[id])
+
+    @property
+    def data_file_id(self):
+        return self.source_file_id or self.id
+
+    @property
+    def data_file_key(self):
+        # file_key under which the rows and summary of this upload are stored
+        return self.source.file_key if self.source_file_id else self.file_key
\ No newline at end of file
@@ -0,0 +1,69 @@
+# apps/service/aggregation.py
+
+import numpy as np
+import pandas as pd
+
+from apps.service.dimensions import month_label
+
+# AnalyticsSummary JSON fields, in the order they are stored
+SUMMARY_FIELDS = ["total_sales_product", "total_sales_region", "monthly_trends"]
+
+
+def _sum_by(keys, revenue):
+    """Native group-by sum: factorize the keys once, then a weighted bincount."""
+    codes, uniques = pd.factorize(keys)
+    return uniques, np.bincount(codes, weights=revenue, minlength=len(uniques))
+
+
+def partial_totals(df: pd.DataFrame):
+    """Product, region and month revenue totals of a cleaned frame.
+
+    Revenue is computed once as a vector and summed per key with native
+    bincounts. Months come straight from the integer `date_key` (yyyymmdd)
+    added by clean_frame, so no dates are parsed here.
+    """
+    if df.empty:
+        return {field: pd.Series(dtype="float64") for field in SUMMARY_FIELDS}
+
+    revenue = df["quantity"].to_numpy("float64") * df["price"].to_numpy("float64")
+    products, product_sales = _sum_by(df["product_name"].to_numpy(), revenue)
+    regions, region_sales = _sum_by(df["region"].to_numpy(), revenue)
+    months, month_sales = _sum_by(df["date_key"].to_numpy() // 100, revenue)
+
+    return {
+        "total_sales_product": pd.Series(product_sales, index=products),
+        "total_sales_region": pd.Series(region_sales, index=regions),
+        "monthly_trends": pd.Series(month_sales, index=[month_label(m) for m in months]),
+    }
+
+
+# --- Running totals (for chunked ingestion) ---
+def new_totals():
+    return {field: pd.Series(dtype="float64") for field in SUMMARY_FIELDS}
+
+
+def fold_totals(totals: dict, df: pd.DataFrame):
+    """Add one cleaned chunk to the running totals."""
+    for field, part in partial_totals(df).items():
+        totals[field] = totals[field].add(part, fill_value=0.0)
+    return totals
+
+
+def merge_totals(totals: dict, other: dict):
+    """Add running totals of another frame (or file) into `totals`."""
+    for field in SUMMARY_FIELDS:
+        totals[field] = totals[field].add(other[field], fill_value=0.0)
+    return totals
+
+
+def summary_totals(summary):
+    """Running totals from a stored AnalyticsSummary (or anything with its JSON fields)."""
+    return {field: pd.Series(getattr(summary, field) or {}, dtype="float64") for field in SUMMARY_FIELDS}
+
+
+def finish_totals(totals: dict):
+    """AnalyticsSummary fields as plain {key: float} dicts with sorted keys."""
+    return {
+        field: {str(k): float(v) for k, v in totals[field].sort_index().items()}
+        for field in SUMMARY_FIELDS
+    }
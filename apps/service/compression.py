@@ -0,0 +1,92 @@
+# apps/service/compression.py
+#
+# Compressed CSV uploads (.csv.gz, .csv.zst and .zip archives holding a CSV)
+# are decompressed as a stream straight into the CSV parser; no decompressed
+# copy is ever written to disk.
+
+import gzip
+import zipfile
+
+# Optional zstd decoders: the zstandard package, or pyarrow's built-in codec
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.zst", ".zip")
+UPLOAD_SUFFIXES = CSV_SUFFIXES + (".xlsx",)
+
+
+def compression_of(filename: str):
+    """"gzip", "zstd", "zip" or None for a plain file."""
+    if filename.endswith(".gz"):
+        return "gzip"
+    if filename.endswith(".zst"):
+        return "zstd"
+    if filename.endswith(".zip"):
+        return "zip"
+    return None
+
+
+def _zip_member(archive: zipfile.ZipFile) -> str:
+    for info in archive.infolist():
+        if not info.is_dir() and info.filename.lower().endswith(".csv") and not info.filename.startswith("__MACOSX/"):
+            return info.filename
+    raise ValueError("Zip archive contains no CSV file")
+
+
+class CsvSource:
+    """Decompressed byte stream of an uploaded CSV, used as a context manager.
+
+    `stream` is a readable binary file object. With native=True (and pyarrow
+    installed) plain, gzip and zstd files are read through pyarrow's own
+    memory-mapped / decompressing streams, which its CSV reader consumes
+    without going through Python. tell() is the offset reached in the file on
+    disk (compressed bytes for compressed files).
+    """
+
+    def __init__(self, filepath: str, compression=None, native: bool = False):
+        self.filepath = filepath
+        self.compression = compression
+        self.native = native and pa is not None and compression != "zip"
+        self.raw = None
+        self.stream = None
+
+    def __enter__(self):
+        if self.native:
+            self.raw = pa.memory_map(self.filepath)
+            self.stream = self.raw if self.compression is None else pa.CompressedInputStream(self.raw, self.compression)
+            return self
+
+        self.raw = open(self.filepath, "rb")
+        try:
+            if self.compression is None:
+                self.stream = self.raw
+            elif self.compression == "gzip":
+                self.stream = gzip.GzipFile(fileobj=self.raw)
+            elif self.compression == "zstd":
+                if zstandard is not None:
+                    self.stream = zstandard.ZstdDecompressor().stream_reader(self.raw)
+                elif pa is not None:
+                    self.stream = pa.CompressedInputStream(pa.PythonFile(self.raw, mode="r"), "zstd")
+                else:
+                    raise RuntimeError("Reading .zst files needs the zstandard or pyarrow package")
+            else:
+                archive = zipfile.ZipFile(self.raw)
+                self.stream = archive.open(_zip_member(archive))
+        except BaseException:
+            self.raw.close()
+            raise
+        return self
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def __exit__(self, *exc):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
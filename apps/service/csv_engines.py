@@ -0,0 +1,107 @@
+# apps/service/csv_engines.py
+
+import csv
+import io
+
+import pandas as pd
+
+from apps.core.config import CSV_BLOCK_SIZE
+from apps.service.compression import CsvSource
+
+# Optional multithreaded columnar parser
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Explicit read schema for the analytics columns, so no column type is inferred
+TEXT_COLUMNS = ["date", "product_name", "region"]
+NUMERIC_COLUMNS = ["quantity", "price"]
+
+
+class SchemaMismatch(Exception):
+    """pyarrow could not parse the file (e.g. a row with too many fields); re-read with the lenient engine."""
+
+
+def read_header(filepath: str, compression=None):
+    with CsvSource(filepath, compression) as source:
+        return next(csv.reader(io.TextIOWrapper(source.stream, encoding="utf-8-sig", newline="")), [])
+
+
+def iter_pandas(filepath: str, columns, chunk_size: int, compression=None):
+    """pandas C parser: text columns typed up front, other columns pruned.
+
+    Numeric columns keep pandas' own (fast, C-level) numeric parsing so a stray
+    non-numeric value is coerced and dropped later instead of failing the file.
+    Each frame's attrs["bytes_read"] is the file offset the parser has reached
+    (compressed files are decompressed as a stream, see CsvSource).
+    """
+    options = dict(
+        usecols=lambda col: col in columns,
+        dtype={col: "str" for col in TEXT_COLUMNS},
+    )
+    with CsvSource(filepath, compression) as source:
+        if chunk_size > 0:
+            with pd.read_csv(source.stream, chunksize=chunk_size, **options) as reader:
+                for df in reader:
+                    df.attrs["bytes_read"] = source.tell()
+                    yield df
+        else:
+            df = pd.read_csv(source.stream, **options)
+            df.attrs["bytes_read"] = source.tell()
+            yield df
+
+
+def _cast_numbers(batch):
+    # Numeric columns are read as text and cast batch by batch: a value that is not a
+    # number leaves only its own batch as text, where validation rejects the bad rows
+    # (quantity_not_numeric / price_not_numeric) instead of failing the whole file
+    for col in NUMERIC_COLUMNS:
+        index = batch.schema.get_field_index(col)
+        try:
+            batch = batch.set_column(index, col, pc.cast(batch.column(index), pa.float64()))
+        except pa.ArrowInvalid:
+            pass
+    return batch
+
+
+def iter_pyarrow(filepath: str, columns, chunk_size: int, compression=None):
+    """pyarrow streaming reader: multithreaded block parsing with the explicit schema.
+
+    Frames follow pyarrow's record batches (CSV_BLOCK_SIZE bytes each), so
+    chunk_size is not used here. attrs["bytes_read"] is set as in iter_pandas.
+    Only a malformed file raises SchemaMismatch; bad values are left to validation.
+    """
+    present = [col for col in columns if col in read_header(filepath, compression)]
+    if len(present) < len(columns):
+        # Let the caller report the missing columns
+        yield pd.DataFrame(columns=present)
+        return
+
+    column_types = {col: pa.string() for col in TEXT_COLUMNS + NUMERIC_COLUMNS}
+    with CsvSource(filepath, compression, native=True) as source:
+        try:
+            reader = pa_csv.open_csv(
+                source.stream,
+                read_options=pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=column_types, include_columns=columns, strings_can_be_null=True
+                ),
+            )
+            for batch in reader:
+                df = _cast_numbers(batch).to_pandas()
+                df.attrs["bytes_read"] = source.tell()
+                yield df
+        except pa.ArrowInvalid as e:
+            raise SchemaMismatch(str(e)) from e
+
+
+ENGINES = {"pandas": iter_pandas}
+if pa is not None:
+    ENGINES["pyarrow"] = iter_pyarrow
+
+
+def iter_csv_frames(filepath: str, columns, chunk_size: int, engine: str, compression=None):
+    return ENGINES.get(engine, iter_pandas)(filepath, columns, chunk_size, compression)
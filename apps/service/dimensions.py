@@ -0,0 +1,72 @@
+# apps/service/dimensions.py
+#
+# Dictionary encoding of sales_records: product and region names become integer
+# keys in small dimension tables, and sale dates become yyyymmdd integers.
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+# Names inserted / looked up per statement
+LOOKUP_BATCH = 500
+
+
+class DimensionKeys:
+    """name -> id lookups for one dimension table (Product, Region), cached for one ingest."""
+
+    def __init__(self, model):
+        self.table = model.__table__
+        self.keys = {}
+
+    def encode(self, db: Session, values) -> np.ndarray:
+        """Integer keys for an array of names, creating rows for names not seen before."""
+        codes, uniques = pd.factorize(np.asarray(values))
+        uniques = [str(name) for name in uniques]
+        missing = [name for name in uniques if name not in self.keys]
+        if missing:
+            self._load(db, missing)
+        lookup = np.array([self.keys[name] for name in uniques], dtype=np.int64)
+        return lookup[codes]
+
+    def _load(self, db: Session, names):
+        dialect = db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        for start in range(0, len(names), LOOKUP_BATCH):
+            batch = names[start:start + LOOKUP_BATCH]
+            # Another worker may be adding the same names at the same time
+            db.execute(insert(self.table).values([{"name": n} for n in batch])
+                       .on_conflict_do_nothing(index_elements=["name"]))
+            rows = db.execute(select(self.table.c.id, self.table.c.name).where(self.table.c.name.in_(batch)))
+            self.keys.update({name: key for key, name in rows})
+
+
+# --- Dates ---
+def date_keys(values) -> np.ndarray:
+    """yyyymmdd integers for an array of dates; each distinct value is parsed once.
+
+    Values that are missing or cannot be parsed as a date get key 0.
+    """
+    codes, uniques = pd.factorize(np.asarray(values))
+    days = pd.to_datetime(pd.Series(uniques, dtype=object), format="mixed", errors="coerce")
+    keys = (days.dt.year * 10000 + days.dt.month * 100 + days.dt.day).fillna(0).to_numpy(dtype=np.int64)
+    keys = np.append(keys, 0)  # factorize codes missing values as -1
+    return keys[codes]
+
+
+def to_date_key(value) -> int:
+    # An ISO date string or a date
+    day = pd.Timestamp(value)
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+# Month of rows without a date (legacy rows whose date could not be parsed)
+UNKNOWN_MONTH = "unknown"
+
+
+def month_label(month_key: int) -> str:
+    """yyyymm -> "yyyy-mm" (the format of AnalyticsSummary.monthly_trends); None -> UNKNOWN_MONTH."""
+    if month_key is None:
+        return UNKNOWN_MONTH
+    return f"{month_key // 100:04d}-{month_key % 100:02d}"
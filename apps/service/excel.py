@@ -0,0 +1,124 @@
+# apps/service/excel.py
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from apps.core.config import EXCEL_ENGINE, EXCEL_SHEET_WORKERS
+
+# Optional Rust-based reader (EXCEL_ENGINE=calamine): several times faster than
+# openpyxl, but it loads each sheet into memory as a whole
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+
+def _use_calamine(engine: str) -> bool:
+    # Unknown engines, or calamine without the package, fall back to openpyxl
+    return engine == "calamine" and CalamineWorkbook is not None
+
+
+def _open(filepath: str, engine: str):
+    if _use_calamine(engine):
+        return CalamineWorkbook.from_path(filepath)
+    # read_only streams the sheet XML row by row instead of building every cell object up front
+    return load_workbook(filepath, read_only=True, data_only=True)
+
+
+def _close(wb):
+    if hasattr(wb, "close"):
+        wb.close()
+
+
+def _iter_sheet(wb, sheet_name: str, chunk_size: int):
+    """Yield one worksheet as DataFrames of at most `chunk_size` rows (0 = whole sheet)."""
+    calamine = CalamineWorkbook is not None and isinstance(wb, CalamineWorkbook)
+    if calamine:
+        rows = wb.get_sheet_by_name(sheet_name).iter_rows()
+    else:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+    for df in _frames(rows, chunk_size):
+        # calamine reports empty cells as "" where openpyxl/pandas give None
+        yield df.replace("", None) if calamine else df
+
+
+def _frames(rows, chunk_size: int):
+    header = None
+    for row in rows:
+        if any(value not in (None, "") for value in row):
+            header = [str(value).strip() if value is not None else "" for value in row]
+            break
+    if header is None:
+        return
+
+    width = len(header)
+    batch = []
+    for row in rows:
+        if len(row) != width:
+            row = (tuple(row) + (None,) * width)[:width]
+        batch.append(row)
+        if chunk_size and len(batch) >= chunk_size:
+            yield pd.DataFrame(batch, columns=header)
+            batch = []
+    yield pd.DataFrame(batch, columns=header)
+
+
+def _read_sheet(filepath: str, sheet_name: str, columns, engine: str):
+    # Runs in a worker process: convert one sheet and send back only the needed columns
+    wb = _open(filepath, engine)
+    try:
+        frames = list(_iter_sheet(wb, sheet_name, 0))
+    finally:
+        _close(wb)
+    if not frames or any(col not in frames[0].columns for col in columns):
+        return frames[0].iloc[0:0] if frames else None
+    return frames[0][columns]
+
+
+def iter_excel_frames(filepath: str, columns, chunk_size: int, workers: int = EXCEL_SHEET_WORKERS,
+                      engine: str = EXCEL_ENGINE):
+    """Yield the rows of every sheet that has all `columns`, in chunks of `chunk_size`.
+
+    With openpyxl, single-sheet workbooks (or workers=1) are streamed row by row,
+    so memory is bounded by chunk_size. Multi-sheet workbooks are converted one
+    whole sheet per process (up to `workers` at a time), which trades memory
+    for parallelism. calamine always holds the sheet being read in memory. If
+    no sheet has the columns, the first sheet's empty frame is yielded so the
+    caller can report what is missing.
+    """
+    wb = _open(filepath, engine)
+    sheet_names = list(wb.sheet_names if _use_calamine(engine) else wb.sheetnames)
+    first_header = None
+    matched = False
+    try:
+        if len(sheet_names) == 1 or workers <= 1:
+            for name in sheet_names:
+                for df in _iter_sheet(wb, name, chunk_size):
+                    if any(col not in df.columns for col in columns):
+                        first_header = first_header if first_header is not None else df.iloc[0:0]
+                        break
+                    matched = True
+                    yield df[columns]
+            if not matched and first_header is not None:
+                yield first_header
+            return
+    finally:
+        _close(wb)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(sheet_names))) as pool:
+        count = len(sheet_names)
+        sheets = pool.map(_read_sheet, [filepath] * count, sheet_names, [columns] * count, [engine] * count)
+        for df in sheets:
+            if df is None:
+                continue
+            if any(col not in df.columns for col in columns):
+                first_header = first_header if first_header is not None else df
+                continue
+            matched = True
+            step = chunk_size or max(len(df), 1)
+            for start in range(0, max(len(df), 1), step):
+                yield df.iloc[start:start + step]
+    if not matched and first_header is not None:
+        yield first_header
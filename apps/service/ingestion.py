@@ -0,0 +1,379 @@
+# apps/service/ingestion.py
+
+import io
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from apps.core.config import INGEST_CHUNK_SIZE, INGEST_INSERT_BATCH, EXCEL_READER, CSV_PARSER, PARQUET_SIDECAR
+from apps.core.database import SessionLocal
+from apps.models.uploadedFile import UploadedFile
+from apps.models.salesRecord import SalesRecord
+from apps.models.analyticsSummary import AnalyticsSummary
+from apps.models.uploadBatch import UploadBatch
+from apps.models.product import Product
+from apps.models.region import Region
+from apps.service.aggregation import new_totals, fold_totals, merge_totals, finish_totals, summary_totals
+from apps.service.csv_engines import iter_csv_frames, SchemaMismatch
+from apps.service.compression import CSV_SUFFIXES, compression_of
+from apps.service.excel import iter_excel_frames
+from apps.service.jobs import LeaseLost
+from apps.service.sidecar import SidecarWriter, RejectedRowsWriter, sidecar_path, rejected_path
+from apps.service.dimensions import DimensionKeys
+from apps.service.validation import validate_frame
+
+# Required columns for analytics
+REQUIRED_COLUMNS = ["date", "product_name", "quantity", "price", "region"]
+# Columns written to sales_records for every row
+SALES_COLUMNS = ["file_key", "date_key", "product_id", "quantity", "price", "region_id"]
+
+
+# --- Reading ---
+def iter_frames(filepath: str, filename: str, chunk_size: int = INGEST_CHUNK_SIZE, csv_parser: str = CSV_PARSER):
+    """Yield the upload as DataFrames of bounded size.
+
+    CSV files go through the configured parser engine and (with
+    EXCEL_READER=stream) Excel workbooks are streamed, so peak memory does not
+    depend on the file size; chunk_size=0 reads the whole file as one frame.
+    """
+    if filename.endswith(CSV_SUFFIXES):
+        yield from iter_csv_frames(filepath, REQUIRED_COLUMNS, chunk_size, csv_parser, compression_of(filename))
+    elif EXCEL_READER == "stream":
+        yield from iter_excel_frames(filepath, REQUIRED_COLUMNS, chunk_size)
+    else:
+        yield pd.read_excel(filepath)
+
+
+def missing_columns(df: pd.DataFrame):
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+# --- Cleaning ---
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows of `df` that pass validation (see apps/service/validation.py)."""
+    return validate_frame(df).valid
+
+
+# --- Loading ---
+def new_dimensions():
+    return {"product_id": DimensionKeys(Product), "region_id": DimensionKeys(Region)}
+
+
+def insert_sales_frame(db: Session, file_key: int, df: pd.DataFrame, dimensions=None,
+                       batch_size: int = INGEST_INSERT_BATCH, copy=None):
+    """Insert a cleaned frame into sales_records, inside the caller's transaction.
+
+    Product and region names are replaced by their dimension keys (`dimensions`
+    caches them across the chunks of one ingest). On PostgreSQL (or with
+    copy=True) rows are streamed with COPY FROM STDIN; otherwise the INSERT is
+    compiled once and sent as executemany batches of `batch_size` rows, as
+    tuples for positional paramstyles and as dicts for named ones. No ORM
+    objects are built.
+    """
+    dimensions = dimensions or new_dimensions()
+    # Bind by mapper, so a sharded session hands out the connection of the user's shard
+    conn = db.connection(bind_arguments={"mapper": SalesRecord})
+    columns = pd.DataFrame({
+        "file_key": file_key,
+        "date_key": df["date_key"].to_numpy(),
+        "product_id": dimensions["product_id"].encode(db, df["product_name"].to_numpy()),
+        "quantity": df["quantity"].to_numpy(),
+        "price": df["price"].to_numpy(),
+        "region_id": dimensions["region_id"].encode(db, df["region"].to_numpy()),
+    })
+    if copy is None:
+        copy = conn.dialect.name == "postgresql"
+    if copy:
+        copy_rows(conn, SalesRecord.__tablename__, columns, batch_size)
+        return
+
+    compiled = insert(SalesRecord.__table__).compile(dialect=conn.dialect, column_keys=SALES_COLUMNS)
+    if compiled.positional:
+        columns = columns[list(compiled.positiontup)]
+    for start in range(0, len(columns), batch_size):
+        batch = columns.iloc[start:start + batch_size]
+        if compiled.positional:
+            params = list(batch.itertuples(index=False, name=None))
+        else:
+            params = batch.to_dict("records")
+        conn.exec_driver_sql(str(compiled), params)
+
+
+def copy_rows(conn, table: str, columns: pd.DataFrame, batch_size: int):
+    """Stream a frame into `table` with PostgreSQL COPY, as CSV text `batch_size` rows at a time."""
+    sql = f"COPY {table} ({', '.join(columns.columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy"):
+            # psycopg 3: one COPY, fed batch by batch
+            with cursor.copy(sql) as copy:
+                for start in range(0, len(columns), batch_size):
+                    copy.write(columns.iloc[start:start + batch_size].to_csv(header=False, index=False))
+        else:
+            # psycopg2: one COPY per batch
+            for start in range(0, len(columns), batch_size):
+                batch = columns.iloc[start:start + batch_size].to_csv(header=False, index=False)
+                cursor.copy_expert(sql, io.StringIO(batch))
+    finally:
+        cursor.close()
+
+
+def delete_sales_rows(db: Session, file_key: int):
+    db.query(SalesRecord).filter(SalesRecord.file_key == file_key).delete(synchronize_session=False)
+
+
+# --- Progress ---
+class IngestProgress:
+    """Counters and per-stage wall time of one ingest, written to the UploadedFile row."""
+
+    def __init__(self, uploaded_file: UploadedFile):
+        self.uploaded_file = uploaded_file
+        self.started = time.perf_counter()
+        self.timings = defaultdict(float)
+        self.rows_parsed = 0
+        self.rows_inserted = 0
+        self.bytes_read = 0
+        self.rejections = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def chunk(self, parsed: int, inserted: int, rejections: dict, bytes_read=None):
+        self.rows_parsed += parsed
+        self.rows_inserted += inserted
+        for rule, count in rejections.items():
+            self.rejections[rule] += count
+        if bytes_read is not None:
+            self.bytes_read = bytes_read
+
+    def flush(self):
+        """Copy the counters onto the upload; they become visible with the caller's commit."""
+        elapsed = time.perf_counter() - self.started
+        f = self.uploaded_file
+        f.rows_parsed = self.rows_parsed
+        f.rows_inserted = self.rows_inserted
+        f.rows_rejected = self.rows_parsed - self.rows_inserted
+        f.rejection_counts = {rule: count for rule, count in self.rejections.items() if count}
+        f.bytes_read = self.bytes_read
+        f.stage_timings = {name: round(seconds, 3) for name, seconds in self.timings.items()}
+        f.rows_per_sec = round(self.rows_inserted / elapsed, 1) if elapsed > 0 else None
+
+
+# --- Pipeline ---
+def commit(db: Session, check_lease=None):
+    # A worker whose job lease is gone must not commit: the upload may belong to another worker now
+    if check_lease:
+        check_lease()
+    db.commit()
+
+
+def ingest_rows(db: Session, uploaded_file: UploadedFile, csv_parser: str = CSV_PARSER,
+                dimensions=None, commit_chunks: bool = True, check_lease=None):
+    """Stream the upload chunk by chunk: insert rows, append them to the Parquet
+    sidecar and fold them into running totals.
+
+    With commit_chunks, each chunk is committed together with the progress
+    counters, so the status endpoint can follow a long ingest; otherwise the
+    caller commits. Rows left by an earlier, interrupted attempt are deleted first.
+    `check_lease` (see apps.service.jobs.Lease) runs before every commit.
+
+    Returns the totals, or None after marking the upload failed for missing columns.
+    """
+    totals = new_totals()
+    dimensions = dimensions or new_dimensions()
+    progress = IngestProgress(uploaded_file)
+    sidecar = SidecarWriter(sidecar_path(uploaded_file.filepath, uploaded_file.id)) if PARQUET_SIDECAR else None
+    rejects = RejectedRowsWriter(rejected_path(uploaded_file.filepath, uploaded_file.id))
+    try:
+        delete_sales_rows(db, uploaded_file.file_key)
+        frames = iter_frames(uploaded_file.filepath, uploaded_file.filename, csv_parser=csv_parser)
+        while True:
+            with progress.stage("parse"):
+                df = next(frames, None)
+            if df is None:
+                break
+            missing_cols = missing_columns(df)
+            if missing_cols:
+                delete_sales_rows(db, uploaded_file.file_key)
+                uploaded_file.status = "failed"
+                uploaded_file.error_message = f"Missing columns: {missing_cols}"
+                if commit_chunks:
+                    commit(db, check_lease)
+                if sidecar:
+                    sidecar.discard()
+                rejects.discard()
+                return None
+
+            parsed = len(df)
+            bytes_read = df.attrs.get("bytes_read")
+            with progress.stage("validate"):
+                validation = validate_frame(df)
+                rejects.write(validation.rejected, progress.rows_parsed + 1)
+            df = validation.valid
+            with progress.stage("insert"):
+                insert_sales_frame(db, uploaded_file.file_key, df, dimensions)
+            if sidecar:
+                with progress.stage("sidecar"):
+                    sidecar.write(df)
+            with progress.stage("aggregate"):
+                fold_totals(totals, df)
+
+            progress.chunk(parsed, len(df), validation.counts, bytes_read)
+            progress.flush()
+            if commit_chunks:
+                with progress.stage("commit"):
+                    commit(db, check_lease)
+    except BaseException:
+        if sidecar:
+            sidecar.discard()
+        rejects.discard()
+        raise
+
+    if sidecar:
+        uploaded_file.parquet_path = sidecar.close()
+    uploaded_file.rejected_path = rejects.close()
+    # Readers that report no offset (Excel) have consumed the whole file by now
+    progress.bytes_read = os.path.getsize(uploaded_file.filepath)
+    progress.flush()
+    return totals
+
+
+def ingest_file(db: Session, uploaded_file: UploadedFile, dimensions=None, commit_chunks: bool = True,
+                check_lease=None):
+    """Ingest one upload and add its AnalyticsSummary (not committed).
+
+    Returns the totals, or None if the upload was marked failed for missing columns.
+    """
+    uploaded_file.status = "processing"
+    try:
+        totals = ingest_rows(db, uploaded_file, dimensions=dimensions, commit_chunks=commit_chunks,
+                             check_lease=check_lease)
+    except SchemaMismatch:
+        # pyarrow could not parse the file at all (non-numeric values are rejected row by
+        # row instead): start over with the lenient parser, which deletes the rows inserted so far
+        totals = ingest_rows(db, uploaded_file, csv_parser="pandas", dimensions=dimensions,
+                             commit_chunks=commit_chunks, check_lease=check_lease)
+    if totals is None:
+        return None
+
+    db.add(AnalyticsSummary(file_key=uploaded_file.file_key, **finish_totals(totals)))
+    uploaded_file.status = "done"
+    return totals
+
+
+def process_file(file_id: str, raise_errors: bool = False, check_lease=None):
+    """Ingest one upload: stream, validate and insert its rows, then store its AnalyticsSummary.
+
+    Failures mark the upload as failed; with raise_errors=True the error is
+    re-raised afterwards so the job queue can retry it. LeaseLost from
+    `check_lease` rolls back and is re-raised without touching the upload.
+    """
+    db = SessionLocal()
+    uploaded_file = None
+    try:
+        uploaded_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+        if not uploaded_file:
+            return
+        uploaded_file.status = "processing"
+        commit(db, check_lease)
+
+        ingest_file(db, uploaded_file, check_lease=check_lease)
+        commit(db, check_lease)
+
+    except LeaseLost:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        if uploaded_file is not None:
+            # Chunks are committed as they go; do not leave a partial upload behind
+            delete_sales_rows(db, uploaded_file.file_key)
+            uploaded_file.status = "failed"
+            uploaded_file.error_message = str(e)
+            commit(db, check_lease)
+        print(f"Error processing file {file_id}: {e}")
+        if raise_errors:
+            raise
+    finally:
+        db.close()
+
+
+def batch_totals(db: Session, batch: UploadBatch):
+    """Cross-file totals of an UploadBatch: the AnalyticsSummary of every finished file, added up."""
+    keys = [uploaded_file.data_file_key for uploaded_file in batch.files if uploaded_file.status == "done"]
+    summaries = {summary.file_key: summary
+                 for summary in db.query(AnalyticsSummary).filter(AnalyticsSummary.file_key.in_(keys))}
+    combined = new_totals()
+    for key in keys:
+        # Copies of the same file each count, like separate uploads
+        if key in summaries:
+            merge_totals(combined, summary_totals(summaries[key]))
+    return finish_totals(combined)
+
+
+def process_batch(batch_id: str, raise_errors: bool = False, check_lease=None):
+    """Ingest every file of an UploadBatch, then store the cross-file totals.
+
+    The files share one connection and the product/region key caches; each
+    file is committed once, when it is finished, rather than per chunk. A file
+    that cannot be read is marked failed and the rest of the batch goes on;
+    database errors fail the whole batch so the job queue can retry it
+    (already finished files are skipped).
+    """
+    db = SessionLocal()
+    batch = None
+    try:
+        batch = db.query(UploadBatch).filter(UploadBatch.id == batch_id).first()
+        if not batch:
+            return
+        batch.status = "processing"
+        commit(db, check_lease)
+
+        dimensions = new_dimensions()
+        for uploaded_file in batch.files:
+            if uploaded_file.status == "done":
+                # Deduplicated on upload, or finished by an earlier attempt
+                continue
+            try:
+                ingest_file(db, uploaded_file, dimensions, commit_chunks=False)
+            except (SQLAlchemyError, LeaseLost):
+                raise
+            except Exception as e:
+                delete_sales_rows(db, uploaded_file.file_key)
+                uploaded_file.status = "failed"
+                uploaded_file.error_message = str(e)
+                print(f"Error processing file {uploaded_file.id}: {e}")
+            commit(db, check_lease)
+
+        for field, values in batch_totals(db, batch).items():
+            setattr(batch, field, values)
+        batch.status = "done"
+        batch.finished_at = datetime.utcnow()
+        commit(db, check_lease)
+
+    except LeaseLost:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        if batch is not None:
+            batch.status = "failed"
+            batch.error_message = str(e)
+            commit(db, check_lease)
+        print(f"Error processing batch {batch_id}: {e}")
+        if raise_errors:
+            raise
+    finally:
+        db.close()
@@ -0,0 +1,150 @@
+# apps/service/jobs.py
+
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from apps.core.config import INGEST_MAX_ATTEMPTS, INGEST_LEASE_SECONDS, INGEST_RETRY_DELAY_SECONDS
+from apps.models.ingestJob import IngestJob
+from apps.models.uploadedFile import UploadedFile
+from apps.models.uploadBatch import UploadBatch
+
+
+def enqueue(db: Session, uploaded_file_id: str, user_id: int = None, max_attempts: int = INGEST_MAX_ATTEMPTS):
+    """Queue an upload for ingestion; committed together with the caller's transaction."""
+    job = IngestJob(uploaded_file_id=uploaded_file_id, user_id=user_id, status="queued", attempts=0,
+                    max_attempts=max_attempts, available_at=datetime.utcnow())
+    db.add(job)
+    return job
+
+
+def enqueue_batch(db: Session, batch_id: str, user_id: int = None, max_attempts: int = INGEST_MAX_ATTEMPTS):
+    """Queue all files of an UploadBatch as one job, ingested together by a single worker."""
+    job = IngestJob(batch_id=batch_id, user_id=user_id, status="queued", attempts=0,
+                    max_attempts=max_attempts, available_at=datetime.utcnow())
+    db.add(job)
+    return job
+
+
+def _claimable(now: datetime):
+    # Queued jobs whose retry delay has passed, or running jobs whose worker stopped renewing the lease
+    return or_(
+        and_(IngestJob.status == "queued", IngestJob.available_at <= now),
+        and_(IngestJob.status == "running", IngestJob.lease_expires_at < now),
+    )
+
+
+def claim(db: Session, worker_id: str, lease_seconds: int = INGEST_LEASE_SECONDS):
+    """Atomically lease the next job to `worker_id`, or return None if the queue is empty.
+
+    The pick and the lease happen in one UPDATE, and the claimable condition is
+    checked again on the row being updated, so two workers can never hold the
+    same job at once.
+    """
+    now = datetime.utcnow()
+    token = f"{worker_id}:{uuid.uuid4().hex}"
+    next_job = (
+        select(IngestJob.id)
+        .where(_claimable(now))
+        .order_by(IngestJob.available_at, IngestJob.id)
+        .limit(1)
+        # PostgreSQL: skip rows another worker is claiming (a no-op on SQLite)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(IngestJob)
+        .where(IngestJob.id == next_job, _claimable(now))
+        .values(status="running", lease_token=token, attempts=IngestJob.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount == 0:
+        return None
+    return db.query(IngestJob).filter(IngestJob.lease_token == token).first()
+
+
+def renew(db: Session, job: IngestJob, lease_seconds: int = INGEST_LEASE_SECONDS) -> bool:
+    """Extend the lease; False means another worker has taken the job over."""
+    result = db.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job.id, IngestJob.lease_token == job.lease_token)
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class Lease:
+    """The lease on a claimed job, renewed by the worker's heartbeat thread.
+
+    The ingest calls check() before each commit. It raises LeaseLost once a
+    renewal has found the job taken over, or once the last successful renewal
+    is older than two thirds of the lease: the worker stops before the lease
+    can expire and another worker claim the job.
+    """
+
+    def __init__(self, job: IngestJob, claimed_at: float, lease_seconds: int = INGEST_LEASE_SECONDS):
+        self.job = job
+        self.lease_seconds = lease_seconds
+        self.renewed_at = claimed_at  # time.monotonic() before the claim / last successful renewal
+        self.lost = False
+
+    def renew(self, db: Session) -> bool:
+        started = time.monotonic()
+        if renew(db, self.job, self.lease_seconds):
+            self.renewed_at = started
+            return True
+        self.lost = True
+        return False
+
+    def check(self):
+        if self.lost or time.monotonic() - self.renewed_at > self.lease_seconds * 2 / 3:
+            raise LeaseLost(f"Lost the lease on job {self.job.id}")
+
+
+def complete(db: Session, job: IngestJob):
+    db.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job.id, IngestJob.lease_token == job.lease_token)
+        .values(status="done", lease_token=None, lease_expires_at=None, finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def fail(db: Session, job: IngestJob, error: str):
+    """Record a failed attempt: requeue with exponential backoff, or give up after max_attempts."""
+    now = datetime.utcnow()
+    values = {"lease_token": None, "lease_expires_at": None, "last_error": error}
+    if job.attempts >= job.max_attempts:
+        values.update(status="failed", finished_at=now)
+    else:
+        delay = INGEST_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+        values.update(status="queued", available_at=now + timedelta(seconds=delay))
+
+    result = db.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job.id, IngestJob.lease_token == job.lease_token)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        status = "failed" if values["status"] == "failed" else "pending"
+        if job.batch_id:
+            target = db.query(UploadBatch).filter(UploadBatch.id == job.batch_id).first()
+        else:
+            target = db.query(UploadedFile).filter(UploadedFile.id == job.uploaded_file_id).first()
+        if target:
+            target.status = status
+            target.error_message = error
+    db.commit()
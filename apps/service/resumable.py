@@ -0,0 +1,100 @@
+# apps/service/resumable.py
+#
+# Resumable uploads: the client declares the file size, then sends numbered
+# chunks (in any order, in parallel, and again after a dropped connection).
+# Each chunk is written straight to its offset in one preallocated file, and
+# its hash blocks are digested as it arrives, so finalizing neither assembles
+# nor re-reads the file.
+
+import hashlib
+import os
+from pathlib import Path
+
+import anyio
+
+from apps.core.config import UPLOAD_CHUNK_SIZE
+from apps.service.uploads import HASH_BLOCK_SIZE, UploadStats
+
+
+class ChunkError(Exception):
+    pass
+
+
+def total_chunks(size_bytes: int, chunk_size: int) -> int:
+    return max((size_bytes + chunk_size - 1) // chunk_size, 1)
+
+
+def expected_chunk_size(index: int, size_bytes: int, chunk_size: int) -> int:
+    return min(chunk_size, size_bytes - index * chunk_size)
+
+
+def preallocate(path: Path, size_bytes: int):
+    # Sparse on most filesystems: no data is written until the chunks arrive
+    with open(path, "wb") as f:
+        f.truncate(size_bytes)
+
+
+def _write_at(fd: int, stats: UploadStats, block: bytes, offset: int):
+    # Runs in the thread pool, like the write: hashing must not hold up the event loop
+    os.pwrite(fd, block, offset)
+    stats.update(block)
+
+
+async def write_chunk(stream, path: Path, offset: int, expected_size: int) -> UploadStats:
+    """Write one chunk body from an async byte `stream` at `offset` in `path`.
+
+    Returns the chunk's UploadStats (size, line counts, and the digests of the
+    hash blocks that start inside it). Raises ChunkError if the body is not
+    exactly `expected_size` bytes; bytes already written are simply
+    overwritten when the chunk is sent again.
+    """
+    fd = os.open(path, os.O_WRONLY)
+    stats = UploadStats(offset)
+    buffer = bytearray()
+    try:
+        async for piece in stream:
+            if stats.size_bytes + len(buffer) + len(piece) > expected_size:
+                raise ChunkError(f"Chunk is larger than {expected_size} bytes")
+            buffer += piece
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await anyio.to_thread.run_sync(_write_at, fd, stats, bytes(buffer), offset + stats.size_bytes)
+                buffer.clear()
+        if buffer:
+            await anyio.to_thread.run_sync(_write_at, fd, stats, bytes(buffer), offset + stats.size_bytes)
+    finally:
+        os.close(fd)
+    if stats.size_bytes != expected_size:
+        raise ChunkError(f"Chunk has {stats.size_bytes} bytes, expected {expected_size}")
+    return stats
+
+
+def chunk_digests(stats: UploadStats, file_size: int):
+    """(first_block, block_digests) to store on the UploadChunk: the chunk's block digests as one hex string."""
+    digests = stats.block_digests(file_size)
+    if not digests:
+        return None, None
+    return min(digests), "".join(digests[number].hex() for number in sorted(digests))
+
+
+def assembled_stats(path: Path, chunks, size_bytes: int) -> UploadStats:
+    """UploadStats of the finished file, from the chunk records.
+
+    Only hash blocks that straddle two chunks are read back from the file; with
+    a chunk size that is a multiple of HASH_BLOCK_SIZE (the default) none are.
+    """
+    stats = UploadStats()
+    for chunk in chunks:
+        hexdigests = chunk.block_digests or ""
+        for i in range(0, len(hexdigests), 64):
+            stats.digests[chunk.first_block + i // 64] = bytes.fromhex(hexdigests[i:i + 64])
+    missing = [n for n in range((size_bytes + HASH_BLOCK_SIZE - 1) // HASH_BLOCK_SIZE) if n not in stats.digests]
+    if missing:
+        with open(path, "rb") as f:
+            for number in missing:
+                f.seek(number * HASH_BLOCK_SIZE)
+                stats.digests[number] = hashlib.sha256(f.read(HASH_BLOCK_SIZE)).digest()
+    chunks = sorted(chunks, key=lambda c: c.index)
+    stats.size_bytes = sum(c.size_bytes for c in chunks)
+    stats.newlines = sum(c.newlines for c in chunks)
+    stats.ends_with_newline = chunks[-1].ends_with_newline if chunks else True
+    return stats
@@ -0,0 +1,302 @@
+# apps/service/retention.py
+#
+# Deleting uploads (one on request, or all past RETENTION_DAYS): sales rows go in
+# small set-based batches with a commit after each, so an ingest waiting for the
+# write lock gets it between batches; freed pages are then returned to the OS a
+# few at a time with PRAGMA incremental_vacuum. The DELETE endpoint only marks an
+# upload "deleting"; the worker pool's purge process does the work. A deletion is
+# claimed, like an ingest job, so two processes never work on the same upload and
+# one only takes over a deletion whose claim has expired.
+
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from apps.core.config import (
+    RETENTION_DAYS, PURGE_BATCH_ROWS, PURGE_VACUUM_PAGES, RESUMABLE_EXPIRY_HOURS, DELETE_LEASE_SECONDS,
+)
+from apps.core.database import SessionLocal, incremental_vacuum, shard_user_ids, user_shard
+from apps.models.analyticsSummary import AnalyticsSummary
+from apps.models.ingestJob import IngestJob
+from apps.models.uploadBatch import UploadBatch
+from apps.models.salesRecord import SalesRecord
+from apps.models.uploadChunk import UploadChunk
+from apps.models.uploadedFile import UploadedFile
+from apps.models.uploadSession import UploadSession
+from apps.service.ingestion import batch_totals
+
+# Uploads that can be deleted: ingest has finished one way or the other
+DELETABLE_STATUSES = ("done", "failed")
+# Jobs that may still write an upload's rows, or set it back to "pending" for a retry
+LIVE_JOB_STATUSES = ("queued", "running")
+# Copied to a dedup copy that takes over the data of a deleted upload
+INGEST_FIELDS = ("parquet_path", "rejected_path", "rows_parsed", "rows_inserted", "rows_rejected",
+                 "bytes_read", "stage_timings", "rows_per_sec", "rejection_counts")
+
+
+def _deletable():
+    # Finished, and no ingest job left that could retry it; the check and the
+    # status change are one UPDATE, so a job cannot be requeued in between
+    live_job = select(IngestJob.id).where(
+        IngestJob.status.in_(LIVE_JOB_STATUSES),
+        or_(IngestJob.uploaded_file_id == UploadedFile.id,
+            and_(UploadedFile.batch_id.is_not(None), IngestJob.batch_id == UploadedFile.batch_id)),
+    ).exists()
+    return and_(UploadedFile.status.in_(DELETABLE_STATUSES), ~live_job)
+
+
+def mark_for_deletion(db: Session, uploaded_file: UploadedFile) -> bool:
+    """Hide the upload from dedup and queue its deletion for delete_marked().
+
+    Returns False if its ingest job is still queued or running.
+    """
+    result = db.execute(
+        update(UploadedFile)
+        .where(UploadedFile.id == uploaded_file.id, or_(UploadedFile.status == "deleting", _deletable()))
+        .values(status="deleting")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+class DeletionLost(Exception):
+    pass
+
+
+def _claimable(now: datetime):
+    # Marked for deletion, and nobody is deleting it or its claim has expired
+    return and_(UploadedFile.status == "deleting",
+                or_(UploadedFile.deletion_lease_expires_at.is_(None), UploadedFile.deletion_lease_expires_at < now))
+
+
+def claim_deletion(db: Session, file_id: str, lease_seconds: int = DELETE_LEASE_SECONDS):
+    """Atomically claim the deletion of an upload marked "deleting"; returns the claim token, or None."""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    result = db.execute(
+        update(UploadedFile)
+        .where(UploadedFile.id == file_id, _claimable(now))
+        .values(deletion_token=token, deletion_lease_expires_at=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return token if result.rowcount == 1 else None
+
+
+def renew_deletion(db: Session, file_id: str, token: str, lease_seconds: int = DELETE_LEASE_SECONDS):
+    """Extend the claim inside the current transaction, before its commit; raises DeletionLost if it was taken over."""
+    result = db.execute(
+        update(UploadedFile)
+        .where(UploadedFile.id == file_id, UploadedFile.deletion_token == token)
+        .values(deletion_lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise DeletionLost(f"Lost the claim on deleting upload {file_id}")
+
+
+def _row_batch(file_key: int, batch_size: int):
+    return select(SalesRecord.id).where(SalesRecord.file_key == file_key).limit(batch_size).scalar_subquery()
+
+
+def _in_batches(db: Session, statement, batch_size: int, keep_claim=None) -> int:
+    # Run a statement that touches at most `batch_size` rows until it touches fewer;
+    # `keep_claim` runs in every transaction, before its commit
+    total = 0
+    while True:
+        count = db.execute(statement.execution_options(synchronize_session=False)).rowcount
+        if keep_claim:
+            keep_claim()
+        db.commit()
+        total += count
+        if count < batch_size:
+            return total
+
+
+def delete_sales_rows_in_batches(db: Session, file_key: int, batch_size: int = PURGE_BATCH_ROWS,
+                                 keep_claim=None) -> int:
+    return _in_batches(db, delete(SalesRecord).where(SalesRecord.id.in_(_row_batch(file_key, batch_size))),
+                       batch_size, keep_claim)
+
+
+def move_sales_rows_in_batches(db: Session, file_key: int, to_file_key: int, batch_size: int = PURGE_BATCH_ROWS,
+                               keep_claim=None) -> int:
+    return _in_batches(
+        db,
+        update(SalesRecord).where(SalesRecord.id.in_(_row_batch(file_key, batch_size))).values(file_key=to_file_key),
+        batch_size,
+        keep_claim,
+    )
+
+
+def reclaim_free_pages(db: Session, pages: int = PURGE_VACUUM_PAGES) -> int:
+    """Shrink the SQLite file by `pages` free pages per transaction; returns the pages released.
+
+    Does nothing unless the database uses auto_vacuum=INCREMENTAL (see
+    apps/maintenance.py; PostgreSQL leaves this to autovacuum).
+    """
+    conn = db.connection(bind_arguments={"mapper": SalesRecord})
+    if conn.dialect.name != "sqlite" or conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+        return 0
+    released = 0
+    free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    while free:
+        incremental_vacuum(conn, pages)
+        db.commit()
+        conn = db.connection(bind_arguments={"mapper": SalesRecord})
+        left = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if left >= free:
+            break
+        released += free - left
+        free = left
+    db.commit()
+    return released
+
+
+def _hand_over(db: Session, uploaded_file: UploadedFile, copies, keep_claim):
+    # Byte-identical copies read the deleted upload's rows, summary and files:
+    # the oldest copy becomes their owner
+    heir, others = copies[0], copies[1:]
+    heir.source_file_id = None
+    for field in INGEST_FIELDS:
+        setattr(heir, field, getattr(uploaded_file, field))
+    for other in others:
+        other.source_file_id = heir.id
+    db.execute(update(AnalyticsSummary).where(AnalyticsSummary.file_key == uploaded_file.file_key)
+               .values(file_key=heir.file_key))
+    keep_claim()
+    db.commit()
+    move_sales_rows_in_batches(db, uploaded_file.file_key, heir.file_key, keep_claim=keep_claim)
+
+
+def _update_batch(db: Session, batch_id: str):
+    # The batch's cross-file totals no longer include the deleted upload
+    batch = db.get(UploadBatch, batch_id)
+    if batch is None:
+        return
+    db.refresh(batch, ["files"])
+    batch.file_count = len(batch.files)
+    if batch.status == "done":
+        for field, values in batch_totals(db, batch).items():
+            setattr(batch, field, values)
+    db.commit()
+
+
+def delete_upload(file_id: str, user_id: int = None, lease_seconds: int = DELETE_LEASE_SECONDS) -> bool:
+    """Delete an upload marked for deletion: its sales rows (in batches), summary, job,
+    resumable session and files, and take it out of its batch's totals.
+
+    If dedup copies still use its data, that data is handed over to the oldest
+    copy instead of being deleted. Returns False if the upload does not exist,
+    is not marked for deletion, or another process is deleting it.
+    """
+    with user_shard(user_id):
+        db = SessionLocal()
+        try:
+            token = claim_deletion(db, file_id, lease_seconds)
+            if token is None:
+                return False
+
+            def keep_claim():
+                renew_deletion(db, file_id, token, lease_seconds)
+
+            uploaded_file = db.get(UploadedFile, file_id)
+            paths = []
+            batch_id = uploaded_file.batch_id
+            copies = db.query(UploadedFile).filter(
+                UploadedFile.source_file_id == file_id
+            ).order_by(UploadedFile.uploaded_at, UploadedFile.id).all()
+            if copies:
+                _hand_over(db, uploaded_file, copies, keep_claim)
+            else:
+                if uploaded_file.source_file_id is None:
+                    # A copy shares its source's files; only the source owns them
+                    paths = [uploaded_file.filepath, uploaded_file.parquet_path, uploaded_file.rejected_path]
+                delete_sales_rows_in_batches(db, uploaded_file.file_key, keep_claim=keep_claim)
+                db.execute(delete(AnalyticsSummary).where(AnalyticsSummary.file_key == uploaded_file.file_key))
+
+            keep_claim()
+            sessions = select(UploadSession.id).where(UploadSession.uploaded_file_id == file_id)
+            db.execute(delete(UploadChunk).where(UploadChunk.upload_id.in_(sessions)))
+            db.execute(delete(UploadSession).where(UploadSession.uploaded_file_id == file_id))
+            db.execute(delete(IngestJob).where(IngestJob.uploaded_file_id == file_id))
+            db.execute(delete(UploadedFile).where(UploadedFile.id == file_id))
+            db.commit()
+            if batch_id:
+                _update_batch(db, batch_id)
+
+            for path in paths:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            reclaim_free_pages(db)
+            return True
+        except DeletionLost as e:
+            print(e)
+            return False
+        finally:
+            db.close()
+
+
+def expire_upload_sessions(db: Session, hours: int = RESUMABLE_EXPIRY_HOURS, now: datetime = None) -> int:
+    """Drop resumable sessions still open after `hours` hours (0 = never), with their chunks and .part file."""
+    if hours <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=hours)
+    sessions = db.query(UploadSession).filter(UploadSession.status == "open",
+                                              UploadSession.created_at < cutoff).all()
+    if not sessions:
+        return 0
+    ids = [session.id for session in sessions]
+    db.execute(delete(UploadChunk).where(UploadChunk.upload_id.in_(ids)))
+    db.execute(delete(UploadSession).where(UploadSession.id.in_(ids)))
+    db.commit()
+    for session in sessions:
+        if session.filepath and os.path.exists(session.filepath):
+            os.remove(session.filepath)
+    return len(sessions)
+
+
+def delete_marked() -> int:
+    """Delete every upload marked "deleting" that no other process has claimed, in the
+    main database and every user shard; returns the number of uploads removed."""
+    removed = 0
+    for user_id in [None] + shard_user_ids():
+        with user_shard(user_id):
+            db = SessionLocal()
+            try:
+                marked = [row.id for row in db.query(UploadedFile.id).filter(_claimable(datetime.utcnow()))]
+            finally:
+                db.close()
+        for file_id in marked:
+            removed += delete_upload(file_id, user_id)
+    return removed
+
+
+def purge_expired(days: int = RETENTION_DAYS, now: datetime = None) -> int:
+    """Delete finished uploads older than `days` days (0 = none) along with any other
+    marked deletions, and drop abandoned resumable sessions.
+
+    Covers the main database and every user shard; returns the number of uploads removed.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    for user_id in [None] + shard_user_ids():
+        with user_shard(user_id):
+            db = SessionLocal()
+            try:
+                expire_upload_sessions(db, now=now)
+                if days > 0:
+                    db.execute(
+                        update(UploadedFile)
+                        .where(UploadedFile.uploaded_at < cutoff, _deletable())
+                        .values(status="deleting")
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.commit()
+            finally:
+                db.close()
+    return delete_marked()
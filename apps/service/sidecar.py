@@ -0,0 +1,147 @@
+# apps/service/sidecar.py
+#
+# Compressed Parquet copy of each cleaned upload, for columnar re-analysis
+# without scanning sales_records.
+
+import os
+import uuid
+
+import pandas as pd
+
+from apps.core.config import PARQUET_COMPRESSION
+from apps.service.dimensions import month_label, to_date_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+SIDECAR_COLUMNS = ["date_key", "product_name", "quantity", "price", "region"]
+# Rejected rows keep the values as read (as text), their row number and the rule they failed
+REJECTED_COLUMNS = ["date", "product_name", "quantity", "price", "region"]
+
+
+def sidecar_path(filepath: str, file_id: str) -> str:
+    return os.path.join(os.path.dirname(filepath), f"{file_id}.parquet")
+
+
+def rejected_path(filepath: str, file_id: str) -> str:
+    return os.path.join(os.path.dirname(filepath), f"{file_id}.rejected.parquet")
+
+
+def _schema():
+    return pa.schema([
+        ("date_key", pa.int32()),
+        ("product_name", pa.string()),
+        ("quantity", pa.float64()),
+        ("price", pa.float64()),
+        ("region", pa.string()),
+    ])
+
+
+class SidecarWriter:
+    """Appends cleaned chunks to a Parquet file; a no-op when pyarrow is not installed.
+
+    Chunks go to a private .part file that close() renames into place, so an
+    attempt that is abandoned or discarded never touches the file of another.
+    """
+
+    def __init__(self, path: str):
+        self.path = path if pa is not None else None
+        self.partial = f"{path}.{uuid.uuid4().hex}.part"
+        self.writer = None
+
+    def write(self, df: pd.DataFrame):
+        if self.path is None:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.partial, _schema(), compression=PARQUET_COMPRESSION)
+        columns = df[SIDECAR_COLUMNS].assign(
+            product_name=df["product_name"].astype(str),
+            region=df["region"].astype(str),
+        )
+        self.writer.write_table(pa.Table.from_pandas(columns, schema=_schema(), preserve_index=False))
+
+    def close(self):
+        """Finish the file and return its path (None if nothing was written)."""
+        if self.writer is None:
+            return None
+        self.writer.close()
+        self.writer = None
+        os.replace(self.partial, self.path)
+        return self.path
+
+    def discard(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if os.path.exists(self.partial):
+            os.remove(self.partial)
+
+
+def _rejected_schema():
+    return pa.schema(
+        [("row", pa.int64())]
+        + [(col, pa.string()) for col in REJECTED_COLUMNS]
+        + [("reason", pa.dictionary(pa.int8(), pa.string()))]
+    )
+
+
+class RejectedRowsWriter(SidecarWriter):
+    """Appends rejected rows to a Parquet file (created only if some row is rejected)."""
+
+    def write(self, rejected: pd.DataFrame, first_row: int):
+        """`first_row` is the 1-based row number of the chunk's first data row."""
+        if self.path is None or rejected.empty:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.partial, _rejected_schema(), compression=PARQUET_COMPRESSION)
+        rejected = rejected.reset_index(drop=True)
+        columns = pd.DataFrame({
+            "row": first_row + rejected["position"].to_numpy(),
+            **{col: rejected[col].astype("string") for col in REJECTED_COLUMNS},
+            "reason": rejected["reason"].astype(str),
+        })
+        self.writer.write_table(pa.Table.from_pandas(columns, schema=_rejected_schema(), preserve_index=False))
+
+
+# --- Queries ---
+def can_query(path) -> bool:
+    return pa is not None and bool(path) and os.path.exists(path)
+
+
+def sidecar_totals(path: str, group_by: str, start_date=None, end_date=None, region=None, product_name=None):
+    """Revenue per `group_by` ("product_name", "region" or "month") read from the sidecar.
+
+    Filters are pushed down to the Parquet reader and only the needed columns
+    are read; mirrors the SQL in apps/api/routers/analytics.py.
+    """
+    conditions = []
+    if start_date:
+        conditions.append(ds.field("date_key") >= to_date_key(start_date))
+    if end_date:
+        conditions.append(ds.field("date_key") <= to_date_key(end_date))
+    if region:
+        conditions.append(ds.field("region") == region)
+    if product_name:
+        conditions.append(ds.field("product_name") == product_name)
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+
+    key = "date_key" if group_by == "month" else group_by
+    table = ds.dataset(path, format="parquet").to_table(columns=[key, "quantity", "price"], filter=condition)
+    if group_by == "month":
+        key_values = pc.divide(table["date_key"], 100)  # integer division: yyyymm
+    else:
+        key_values = table[key]
+    revenue = pc.multiply(table["quantity"], table["price"])
+    grouped = pa.table({"key": key_values, "revenue": revenue}).group_by("key").aggregate([("revenue", "sum")])
+    # Sorted by key, like the GROUP BY results from SQLite
+    totals = sorted(zip(grouped["key"].to_pylist(), grouped["revenue_sum"].to_pylist()))
+    if group_by == "month":
+        return {month_label(k): v for k, v in totals}
+    return dict(totals)
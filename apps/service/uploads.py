@@ -0,0 +1,136 @@
+# apps/service/uploads.py
+
+import hashlib
+from pathlib import Path
+
+import anyio
+from fastapi import UploadFile
+
+from apps.core.config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+# Uploads are hashed in blocks of this many bytes (see UploadStats.content_hash).
+# Changing it changes every content hash, and with it dedup against earlier uploads
+HASH_BLOCK_SIZE = 1024 ** 2
+
+
+def combine_digests(digests) -> str:
+    """Content hash from the SHA-256 digests of a file's blocks, in order."""
+    return hashlib.sha256(b"".join(digests)).hexdigest()
+
+
+class UploadStats:
+    """Content hash, byte size and row estimate collected while an upload streams to disk.
+
+    The content hash is the SHA-256 of the SHA-256 digests of the file's
+    HASH_BLOCK_SIZE blocks, so resumable chunks can hash their blocks as they
+    arrive, in any order. With `offset` (the file position of the first byte,
+    for a resumable chunk) only the blocks that start inside the streamed range
+    are hashed.
+    """
+
+    def __init__(self, offset: int = 0):
+        self.offset = offset
+        self.digests = {}  # block number -> SHA-256 digest of that block
+        self.block = None  # hasher of the block being filled
+        self.block_fill = 0
+        # Bytes up to the first block boundary belong to a block that started before `offset`
+        self.skip = -offset % HASH_BLOCK_SIZE
+        self.size_bytes = 0
+        self.newlines = 0
+        self.ends_with_newline = True
+
+    def update(self, chunk: bytes):
+        position = self.offset + self.size_bytes
+        view = memoryview(chunk)
+        if self.skip:
+            skipped = min(self.skip, len(view))
+            view, position, self.skip = view[skipped:], position + skipped, self.skip - skipped
+        while len(view):
+            if self.block is None:
+                self.block, self.block_fill = hashlib.sha256(), 0
+            take = min(len(view), HASH_BLOCK_SIZE - self.block_fill)
+            self.block.update(view[:take])
+            self.block_fill += take
+            view, position = view[take:], position + take
+            if self.block_fill == HASH_BLOCK_SIZE:
+                self.digests[position // HASH_BLOCK_SIZE - 1] = self.block.digest()
+                self.block = None
+        self.size_bytes += len(chunk)
+        self.newlines += chunk.count(b"\n")
+        self.ends_with_newline = chunk.endswith(b"\n")
+
+    def block_digests(self, file_size: int) -> dict:
+        """Digests of the blocks hashed so far; the last, short block of the file counts once it is complete."""
+        digests = dict(self.digests)
+        if self.block is not None and self.offset + self.size_bytes == file_size:
+            digests[(file_size - 1) // HASH_BLOCK_SIZE] = self.block.digest()
+        return digests
+
+    @property
+    def content_hash(self) -> str:
+        digests = self.block_digests(self.offset + self.size_bytes)
+        return combine_digests(digests[number] for number in sorted(digests))
+
+    def row_estimate(self, filename: str):
+        # Only meaningful for plain-text CSV; the header line is not a row
+        if not filename.endswith(".csv") or self.size_bytes == 0:
+            return None
+        lines = self.newlines + (0 if self.ends_with_newline else 1)
+        return max(lines - 1, 0)
+
+
+def _write_block(buffer, stats: UploadStats, block: bytes):
+    # Runs in the thread pool: hashing a large block must not hold up the event loop
+    stats.update(block)
+    buffer.write(block)
+
+
+async def save_stream(stream, destination: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> UploadStats:
+    """Stream an async byte iterator (e.g. request.stream()) to `destination`.
+
+    The size limit is checked as bytes arrive, so an oversized body is refused
+    after max_bytes, not after it has been received in full. Pieces are gathered
+    into UPLOAD_CHUNK_SIZE blocks that are hashed and written in the thread pool.
+    The partial file is removed if the upload exceeds `max_bytes` or fails half way.
+    """
+    stats = UploadStats()
+    received = 0
+    pending = bytearray()
+    try:
+        buffer = await anyio.to_thread.run_sync(open, destination, "wb")
+        try:
+            async for piece in stream:
+                received += len(piece)
+                if max_bytes and received > max_bytes:
+                    raise UploadTooLarge(f"File is larger than {max_bytes} bytes")
+                pending += piece
+                if len(pending) >= UPLOAD_CHUNK_SIZE:
+                    await anyio.to_thread.run_sync(_write_block, buffer, stats, bytes(pending))
+                    pending.clear()
+            if pending:
+                await anyio.to_thread.run_sync(_write_block, buffer, stats, bytes(pending))
+        finally:
+            await anyio.to_thread.run_sync(buffer.close)
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return stats
+
+
+async def save_upload(file: UploadFile, destination: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> UploadStats:
+    """Copy a multipart UploadFile to `destination` (see save_stream).
+
+    Starlette has already spooled the whole part to a temporary file by now, so
+    the size limit only protects the disk copy; PUT /files/upload/{filename}
+    streams the raw body instead.
+    """
+    async def blocks():
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+    return await save_stream(blocks(), destination, max_bytes)
@@ -0,0 +1,64 @@
+# apps/service/validation.py
+#
+# Row validation for ingestion. Every rule is evaluated as a boolean mask over
+# the whole chunk; no Python code runs per row.
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from apps.core.config import ALLOWED_REGIONS
+from apps.service.dimensions import date_keys
+
+# Rule names, in the order used to pick a rejected row's reason
+RULES = [
+    "missing_value",
+    "quantity_not_numeric",
+    "price_not_numeric",
+    "negative_quantity",
+    "negative_price",
+    "bad_date",
+    "unknown_region",
+]
+
+
+@dataclass
+class Validation:
+    valid: pd.DataFrame  # passing rows with numeric quantity/price and a date_key column
+    rejected: pd.DataFrame  # failing rows as read, plus `position` in the chunk and `reason` (first failing rule)
+    counts: dict  # rule -> number of rows failing it (a row can fail several rules)
+
+
+def rule_masks(df: pd.DataFrame, quantity: pd.Series, price: pd.Series, keys: np.ndarray):
+    missing = df[["date", "product_name", "quantity", "price", "region"]].isna()
+    masks = {
+        "missing_value": missing.any(axis=1).to_numpy(),
+        "quantity_not_numeric": (quantity.isna() & ~missing["quantity"]).to_numpy(),
+        "price_not_numeric": (price.isna() & ~missing["price"]).to_numpy(),
+        "negative_quantity": (quantity < 0).to_numpy(),
+        "negative_price": (price < 0).to_numpy(),
+        "bad_date": (keys == 0) & ~missing["date"].to_numpy(),
+        "unknown_region": np.zeros(len(df), dtype=bool),
+    }
+    if ALLOWED_REGIONS:
+        masks["unknown_region"] = (~df["region"].isin(ALLOWED_REGIONS) & ~missing["region"]).to_numpy()
+    return masks
+
+
+def validate_frame(df: pd.DataFrame) -> Validation:
+    quantity = pd.to_numeric(df["quantity"], errors="coerce")
+    price = pd.to_numeric(df["price"], errors="coerce")
+    keys = date_keys(df["date"].to_numpy())
+    masks = rule_masks(df, quantity, price, keys)
+
+    stacked = np.vstack([masks[rule] for rule in RULES]) if len(df) else np.zeros((len(RULES), 0), dtype=bool)
+    bad = stacked.any(axis=0)
+    counts = dict(zip(RULES, stacked.sum(axis=1).tolist()))
+
+    valid = df[~bad].assign(quantity=quantity[~bad], price=price[~bad], date_key=keys[~bad])
+    rejected = df[bad].assign(
+        position=np.flatnonzero(bad),
+        reason=pd.Categorical.from_codes(stacked[:, bad].argmax(axis=0), RULES),
+    )
+    return Validation(valid=valid, rejected=rejected, counts=counts)
@@ -0,0 +1,137 @@
+# apps/worker.py
+#
+# Ingestion worker pool: drains ingest_jobs outside the API process, deletes the
+# uploads marked by DELETE /files/{id} every DELETE_POLL_SECONDS, and runs the
+# retention purge every RETENTION_INTERVAL_SECONDS.
+#
+#   python -m apps.worker
+
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from apps.core.config import (
+    INGEST_WORKERS, INGEST_LEASE_SECONDS, INGEST_POLL_SECONDS, RETENTION_INTERVAL_SECONDS, DELETE_POLL_SECONDS,
+)
+from apps.core.database import SessionLocal, dispose_engines, user_shard
+from apps.core.migrations import migrate
+from apps.service.ingestion import process_file, process_batch
+from apps.service.jobs import Lease, LeaseLost, claim, complete, fail
+from apps.service.retention import delete_marked, purge_expired
+
+
+def keep_lease(lease: Lease, stop: threading.Event):
+    # Renew the lease while the job runs so no other worker reclaims it; once
+    # renewal fails, lease.check() stops the ingest at its next commit
+    while not stop.wait(INGEST_LEASE_SECONDS / 3):
+        db = SessionLocal()
+        try:
+            if not lease.renew(db):
+                return
+        except Exception as e:
+            print(f"Could not renew lease of job {lease.job.id}: {e}")
+        finally:
+            db.close()
+
+
+def run_job(lease: Lease):
+    # The file or batch (and its failure status) live in the owner's shard
+    with user_shard(lease.job.user_id):
+        _run_job(lease)
+
+
+def _run_job(lease: Lease):
+    job = lease.job
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=keep_lease, args=(lease, stop), daemon=True)
+    heartbeat.start()
+    error = None
+    try:
+        if job.attempts > job.max_attempts:
+            # Leased too many times without finishing (the worker kept dying)
+            error = "Gave up after repeated worker crashes"
+        elif job.batch_id:
+            process_batch(job.batch_id, raise_errors=True, check_lease=lease.check)
+        else:
+            process_file(job.uploaded_file_id, raise_errors=True, check_lease=lease.check)
+    except LeaseLost as e:
+        # The job may belong to another worker by now: leave its status alone
+        print(f"Abandoned job {job.id}: {e}")
+        return
+    except Exception as e:
+        error = str(e)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    db = SessionLocal()
+    try:
+        if error is None:
+            complete(db, job)
+        else:
+            fail(db, job, error)
+    finally:
+        db.close()
+
+
+def work(worker_id: str):
+    # Connections inherited from the parent process must not be shared
+    dispose_engines(close=False)
+    while True:
+        claimed_at = time.monotonic()
+        db = SessionLocal()
+        try:
+            job = claim(db, worker_id)
+        finally:
+            db.close()
+        if job is None:
+            time.sleep(INGEST_POLL_SECONDS)
+            continue
+        run_job(Lease(job, claimed_at))
+
+
+def purge():
+    # Requested deletions (and ones interrupted by a restart) on every poll,
+    # expired uploads (RETENTION_DAYS) once per RETENTION_INTERVAL_SECONDS
+    dispose_engines(close=False)
+    next_purge = time.monotonic()
+    while True:
+        try:
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + RETENTION_INTERVAL_SECONDS
+                removed = purge_expired()
+                if removed:
+                    print(f"Retention purge removed {removed} uploads")
+            else:
+                delete_marked()
+        except Exception as e:
+            print(f"Retention purge failed: {e}")
+        time.sleep(DELETE_POLL_SECONDS)
+
+
+def main():
+    # Stop the pool on SIGTERM the same way as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    migrate()
+    host = f"{socket.gethostname()}-{os.getpid()}"
+    processes = [
+        # Not daemonic: a worker may start its own process pool (multi-sheet Excel files)
+        multiprocessing.Process(target=work, args=(f"{host}-{i}",))
+        for i in range(INGEST_WORKERS)
+    ]
+    processes.append(multiprocessing.Process(target=purge))
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_bulk_insert.py
+#
+# Rows/sec of the old iterrows + bulk_save_objects load against insert_sales_frame.
+# Both loaders start from the same raw DataFrame and their timings include the
+# same vectorized conversion work (validation, date keys, dimension keys), so
+# the difference is the insert path itself.
+#
+#   python -m benchmarks.bench_bulk_insert --rows 1000000
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from apps.core.database import Base
+from apps.models.user import User  # noqa: F401  (registers tables on Base.metadata)
+from apps.models.post import Post  # noqa: F401
+from apps.models.uploadedFile import UploadedFile  # noqa: F401
+from apps.models.analyticsSummary import AnalyticsSummary  # noqa: F401
+from apps.models.product import Product  # noqa: F401
+from apps.models.region import Region  # noqa: F401
+from apps.models.salesRecord import SalesRecord
+from apps.service.ingestion import clean_frame, insert_sales_frame, new_dimensions
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2024-01-01", "2025-12-31").strftime("%Y-%m-%d")
+    return pd.DataFrame({
+        "date": rng.choice(days, rows),
+        "product_name": rng.choice([f"Product {i}" for i in range(500)], rows),
+        "quantity": rng.integers(1, 50, rows).astype(float),
+        "price": rng.uniform(0.5, 100, rows).round(2),
+        "region": rng.choice(["Baku", "Ganja", "Sumqayit", "Lankaran", "Shaki"], rows),
+    })
+
+
+def load_orm(db, file_key, df):
+    # Conversion is vectorized as in load_frame, so the loop measures only the ORM insert
+    df = clean_frame(df)
+    dimensions = new_dimensions()
+    keys = pd.DataFrame({
+        "date_key": df["date_key"].to_numpy(),
+        "product_id": dimensions["product_id"].encode(db, df["product_name"].to_numpy()),
+        "quantity": df["quantity"].to_numpy(),
+        "price": df["price"].to_numpy(),
+        "region_id": dimensions["region_id"].encode(db, df["region"].to_numpy()),
+    })
+    sales_records = [
+        SalesRecord(
+            file_key=file_key,
+            date_key=int(row["date_key"]),
+            product_id=int(row["product_id"]),
+            quantity=row["quantity"],
+            price=row["price"],
+            region_id=int(row["region_id"])
+        ) for _, row in keys.iterrows()
+    ]
+    db.bulk_save_objects(sales_records)
+
+
+def load_frame(db, file_key, df):
+    # Validation and date-key conversion are part of the load, as in ingest_rows
+    insert_sales_frame(db, file_key, clean_frame(df), new_dimensions())
+
+
+def run(name, loader, df):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        start = time.perf_counter()
+        loader(db, 1, df)
+        db.commit()
+        elapsed = time.perf_counter() - start
+        db.close()
+        engine.dispose()
+    print(f"{name:<22} {len(df):>10,} rows  {elapsed:8.2f} s  {len(df) / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    run("iterrows + bulk_save", load_orm, df)
+    run("insert_sales_frame", load_frame, df)
+
+
+if __name__ == "__main__":
+    main()
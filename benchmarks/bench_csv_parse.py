@@ -0,0 +1,48 @@
+# benchmarks/bench_csv_parse.py
+#
+# Parse throughput of the CSV parser engines (plus the old untyped pd.read_csv).
+#
+#   python -m benchmarks.bench_csv_parse --rows 2000000
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from apps.service.csv_engines import ENGINES
+from apps.service.ingestion import REQUIRED_COLUMNS
+from benchmarks.bench_bulk_insert import make_frame
+
+
+def untyped(filepath, columns, chunk_size):
+    # The previous reader: no dtypes, no column pruning
+    with pd.read_csv(filepath, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def run(name, engine, filepath, chunk_size):
+    size_mb = os.path.getsize(filepath) / 1024 ** 2
+    start = time.perf_counter()
+    rows = sum(len(df) for df in engine(filepath, REQUIRED_COLUMNS, chunk_size))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {rows:>10,} rows  {elapsed:7.2f} s  {rows / elapsed:>12,.0f} rows/s  {size_mb / elapsed:7.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "bench.csv")
+        make_frame(args.rows).to_csv(filepath, index=False)
+        run("untyped", untyped, filepath, args.chunk_size)
+        for name, engine in ENGINES.items():
+            run(name, engine, filepath, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
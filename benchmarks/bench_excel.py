@@ -0,0 +1,84 @@
+# benchmarks/bench_excel.py
+#
+# Time and peak memory of pd.read_excel against the streaming Excel reader,
+# with each of its engines (openpyxl read-only; calamine when installed).
+#
+#   python -m benchmarks.bench_excel --rows 500000 --sheets 1
+#   python -m benchmarks.bench_excel --rows 500000 --sheets 4
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import pandas as pd
+from openpyxl import Workbook
+
+from apps.service.excel import CalamineWorkbook, iter_excel_frames
+from apps.service.ingestion import REQUIRED_COLUMNS
+from benchmarks.bench_bulk_insert import make_frame
+
+
+def make_workbook(path: str, rows: int, sheets: int):
+    df = make_frame(rows)
+    wb = Workbook(write_only=True)
+    per_sheet = -(-rows // sheets)
+    for i in range(sheets):
+        ws = wb.create_sheet(f"Sheet{i + 1}")
+        ws.append(REQUIRED_COLUMNS)
+        for row in df.iloc[i * per_sheet:(i + 1) * per_sheet].itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(path)
+
+
+def read_pandas(path: str, chunk_size: int):
+    # The old path: default engine, every sheet fully loaded
+    return sum(len(df) for df in pd.read_excel(path, sheet_name=None).values())
+
+
+def read_openpyxl(path: str, chunk_size: int):
+    return sum(len(df) for df in iter_excel_frames(path, REQUIRED_COLUMNS, chunk_size, engine="openpyxl"))
+
+
+def read_calamine(path: str, chunk_size: int):
+    return sum(len(df) for df in iter_excel_frames(path, REQUIRED_COLUMNS, chunk_size, engine="calamine"))
+
+
+def measure(reader, path, chunk_size, queue):
+    start = time.perf_counter()
+    rows = reader(path, chunk_size)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((rows, elapsed, peak_mb))
+
+
+def run(name, reader, path, chunk_size):
+    # Each reader runs in a fresh process so peak RSS is its own
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(reader, path, chunk_size, queue))
+    process.start()
+    rows, elapsed, peak_mb = queue.get()
+    process.join()
+    print(f"{name:<14} {rows:>10,} rows  {elapsed:8.2f} s  {rows / elapsed:>10,.0f} rows/s  peak {peak_mb:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.xlsx")
+        make_workbook(path, args.rows, args.sheets)
+        run("pd.read_excel", read_pandas, path, args.chunk_size)
+        run("openpyxl", read_openpyxl, path, args.chunk_size)
+        if CalamineWorkbook is not None:
+            run("calamine", read_calamine, path, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/bench_file_key.py
+#
+# Size and scan speed of sales_records with the upload's UUID in every row
+# (the layout before the upload_file_keys migration) and with the integer
+# file_key: builds a SQLite database in the old layout, measures it, runs
+# migrate() and measures again. Sizes are after VACUUM, from the dbstat table.
+#
+#   python -m benchmarks.bench_file_key --uploads 20 --rows 50000
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from apps.core.database import sqlite_engine
+from apps.core.migrations import migrate
+
+# sales_records and analytics_summary as created before file_key existed
+OLD_LAYOUT = [
+    "DROP TRIGGER uploaded_files_file_key",
+    "DROP TABLE sales_records",
+    "DROP TABLE analytics_summary",
+    "DROP INDEX ux_uploaded_files_file_key",
+    "ALTER TABLE uploaded_files DROP COLUMN file_key",
+    "CREATE TABLE sales_records (id INTEGER NOT NULL PRIMARY KEY, uploaded_file_id VARCHAR, date_key INTEGER, "
+    "product_id INTEGER, quantity FLOAT, price FLOAT, region_id INTEGER, "
+    "FOREIGN KEY(uploaded_file_id) REFERENCES uploaded_files (id))",
+    "CREATE INDEX ix_sales_records_file_product ON sales_records "
+    "(uploaded_file_id, product_id, date_key, region_id, quantity, price)",
+    "CREATE INDEX ix_sales_records_file_region ON sales_records "
+    "(uploaded_file_id, region_id, date_key, product_id, quantity, price)",
+    "CREATE TABLE analytics_summary (id INTEGER NOT NULL PRIMARY KEY, uploaded_file_id VARCHAR UNIQUE, "
+    "total_sales_product JSON, total_sales_region JSON, monthly_trends JSON, "
+    "FOREIGN KEY(uploaded_file_id) REFERENCES uploaded_files (id))",
+]
+
+QUERIES = {
+    # One upload's slice of the covering indexes, as in /analytics/*
+    "products of one upload": "SELECT p.name, sum(s.quantity * s.price) FROM sales_records s "
+                              "JOIN products p ON s.product_id = p.id WHERE s.{column} = :value GROUP BY p.name",
+    "monthly of one upload": "SELECT date_key / 100, sum(quantity * price) FROM sales_records "
+                             "WHERE {column} = :value GROUP BY 1",
+    # Every row
+    "full scan": "SELECT count(*), sum(quantity * price) FROM sales_records",
+}
+
+
+def build_old_layout(conn, uploads, rows):
+    for statement in OLD_LAYOUT:
+        conn.execute(text(statement))
+    conn.execute(text("DELETE FROM schema_migrations WHERE name IN ('upload_file_keys', 'file_key_counter')"))
+    conn.execute(text("INSERT INTO products (name) VALUES (:name)"), [{"name": f"Product {i}"} for i in range(300)])
+    conn.execute(text("INSERT INTO regions (name) VALUES (:name)"), [{"name": f"Region {i}"} for i in range(5)])
+
+    rng = np.random.default_rng(0)
+    file_ids = [str(uuid.uuid4()) for _ in range(uploads)]
+    conn.execute(text("INSERT INTO uploaded_files (id, filename, status, uploaded_at) VALUES (:id, 'bench', 'done', :at)"),
+                 [{"id": file_id, "at": datetime.utcnow()} for file_id in file_ids])
+    for file_id in file_ids:
+        conn.exec_driver_sql(
+            "INSERT INTO sales_records (uploaded_file_id, date_key, product_id, quantity, price, region_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            list(zip(
+                [file_id] * rows,
+                (20240000 + rng.integers(1, 13, rows) * 100 + rng.integers(1, 29, rows)).tolist(),
+                rng.integers(1, 301, rows).tolist(),
+                rng.integers(1, 50, rows).astype(float).tolist(),
+                rng.uniform(0.5, 100, rows).round(2).tolist(),
+                rng.integers(1, 6, rows).tolist(),
+            )),
+        )
+    return file_ids
+
+
+def measure(engine, name, column, value, repeat):
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        conn.exec_driver_sql("ANALYZE")
+        # WAL mode: move the rewritten pages into the database file before measuring it
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        sizes = dict(conn.exec_driver_sql(
+            "SELECT name, sum(pgsize) FROM dbstat WHERE name = 'sales_records' OR name LIKE 'ix_sales_records%' "
+            "GROUP BY name"
+        ).all())
+        file_size = os.path.getsize(engine.url.database)
+        print(f"{name}: database {file_size / 2**20:8.1f} MiB")
+        for table, size in sorted(sizes.items()):
+            print(f"  {table:<32} {size / 2**20:8.1f} MiB")
+        for label, sql in QUERIES.items():
+            statement = text(sql.format(column=column))
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(statement, {"value": value}).all()
+                best = min(best, time.perf_counter() - start)
+            print(f"  {label:<32} {best * 1000:8.1f} ms")
+    return file_size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50_000, help="rows per upload")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query; the best is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        migrate(engine)
+        with engine.begin() as conn:
+            file_ids = build_old_layout(conn, args.uploads, args.rows)
+        print(f"{args.uploads} uploads x {args.rows:,} rows")
+        before = measure(engine, "uploaded_file_id (UUID)", "uploaded_file_id", file_ids[0], args.repeat)
+
+        start = time.perf_counter()
+        migrate(engine)
+        print(f"upload_file_keys migration: {time.perf_counter() - start:.1f} s")
+        with engine.connect() as conn:
+            key = conn.execute(text("SELECT file_key FROM uploaded_files WHERE id = :id"), {"id": file_ids[0]}).scalar()
+        after = measure(engine, "file_key (integer)", "file_key", key, args.repeat)
+        print(f"database size {after / before:.0%} of before")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/bench_sqlite_concurrency.py
+#
+# Analytics read latency while a large ingest is writing, with SQLite's
+# defaults and with the connection profile from apps/core/database.py.
+#
+#   python -m benchmarks.bench_sqlite_concurrency --rows 2000000
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from apps.core.database import Base, SQLITE_PRAGMAS, sqlite_engine
+from apps.models.user import User  # noqa: F401  (registers tables on Base.metadata)
+from apps.models.post import Post  # noqa: F401
+from apps.models.uploadedFile import UploadedFile  # noqa: F401
+from apps.models.analyticsSummary import AnalyticsSummary  # noqa: F401
+from apps.models.product import Product
+from apps.models.salesRecord import SalesRecord
+from apps.service.ingestion import clean_frame, insert_sales_frame, new_dimensions
+from benchmarks.bench_bulk_insert import make_frame
+
+# file_key of the upload being read and of the one being ingested
+EXISTING, INGEST = 1, 2
+
+
+def load(url, pragmas, file_key, rows, chunk_size):
+    # Runs in its own process, committing once per chunk like process_file
+    engine = sqlite_engine(url, pragmas)
+    db = sessionmaker(bind=engine)()
+    dimensions = new_dimensions()
+    df = clean_frame(make_frame(rows))
+    for start in range(0, len(df), chunk_size):
+        insert_sales_frame(db, file_key, df.iloc[start:start + chunk_size], dimensions)
+        db.commit()
+    db.close()
+    engine.dispose()
+
+
+def read_loop(url, pragmas, stop, latencies, errors):
+    engine = sqlite_engine(url, pragmas, connect_args={"check_same_thread": False})
+    db = sessionmaker(bind=engine)()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            db.query(Product.name, func.sum(SalesRecord.quantity * SalesRecord.price)) \
+              .join(Product, SalesRecord.product_id == Product.id) \
+              .filter(SalesRecord.file_key == EXISTING) \
+              .group_by(Product.name).all()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(time.perf_counter() - start)
+        db.rollback()
+    db.close()
+    engine.dispose()
+
+
+def run(name, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = sqlite_engine(url, pragmas)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        # The upload the readers query
+        load(url, pragmas, EXISTING, args.existing_rows, args.chunk_size)
+
+        latencies, errors = [], []
+        stop = threading.Event()
+        readers = [threading.Thread(target=read_loop, args=(url, pragmas, stop, latencies, errors))
+                   for _ in range(args.readers)]
+        writer = multiprocessing.Process(target=load, args=(url, pragmas, INGEST, args.rows, args.chunk_size))
+        start = time.perf_counter()
+        writer.start()
+        for reader in readers:
+            reader.start()
+        writer.join()
+        ingest_seconds = time.perf_counter() - start
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else float("nan")
+    print(f"{name:<8} ingest {ingest_seconds:6.2f} s | reads {len(latencies):>5}  "
+          f"p50 {statistics.median(latencies) * 1000 if latencies else float('nan'):8.1f} ms  "
+          f"p95 {p95 * 1000:8.1f} ms  max {max(latencies, default=float('nan')) * 1000:8.1f} ms  "
+          f"locked errors {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000, help="rows ingested while reading")
+    parser.add_argument("--existing-rows", type=int, default=200_000, help="rows of the upload being read")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=2)
+    args = parser.parse_args()
+
+    run("default", {}, args)
+    run("profile", SQLITE_PRAGMAS, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/bench_statement_cache.py
+#
+# CPU per request of the hot queries: rebuilding the query on every request (as
+# the endpoints did before, copied below) against the prepared statements of
+# apps/api/routers/analytics.py and apps/api/routers/auth.py, which only bind parameters.
+# An analytics request resolves the upload's file_key and runs one aggregation
+# (SQL path, no sidecar); the products case cycles through all 16 combinations
+# of its optional filters. The upload is small, so query construction is a
+# visible share of the time, as for the many small uploads of a busy server.
+#
+#   python -m benchmarks.bench_statement_cache --requests 2000 --rows 2000
+
+import argparse
+import itertools
+import os
+import tempfile
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased, sessionmaker
+
+from apps.api.routers.analytics import products_query, regions_query, resolve_file_key
+from apps.api.routers.auth import USER_BY_ID
+from apps.core.database import sqlite_engine
+from apps.core.migrations import migrate
+from apps.models.product import Product
+from apps.models.region import Region
+from apps.models.salesRecord import SalesRecord
+from apps.models.uploadedFile import UploadedFile
+from apps.models.user import User
+from apps.service.dimensions import to_date_key
+from apps.service.ingestion import clean_frame, insert_sales_frame, new_dimensions
+from benchmarks.bench_bulk_insert import make_frame
+
+FILE_ID = "bench-statement-cache"
+FILTERS = [
+    dict(zip(("start_date", "end_date", "region", "product_name"), values))
+    for values in itertools.product(*[(None, value) for value in ("2024-03-01", "2024-06-30", "Baku", "Product 7")])
+]
+
+
+# --- Rebuilt on every request ---
+def rebuilt_file_key(db, file_id, user_id):
+    source = aliased(UploadedFile)
+    return db.query(func.coalesce(source.file_key, UploadedFile.file_key)) \
+             .select_from(UploadedFile) \
+             .outerjoin(source, UploadedFile.source_file_id == source.id) \
+             .filter(UploadedFile.id == file_id, UploadedFile.user_id == user_id).scalar()
+
+
+def rebuilt_products(db, file_id, user_id, start_date=None, end_date=None, region=None, product_name=None):
+    query = db.query(Product.name,
+                     func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")) \
+              .join(Product, SalesRecord.product_id == Product.id) \
+              .filter(SalesRecord.file_key == rebuilt_file_key(db, file_id, user_id))
+    if start_date:
+        query = query.filter(SalesRecord.date_key >= to_date_key(start_date))
+    if end_date:
+        query = query.filter(SalesRecord.date_key <= to_date_key(end_date))
+    if region:
+        query = query.join(Region, SalesRecord.region_id == Region.id).filter(Region.name == region)
+    if product_name:
+        query = query.filter(Product.name == product_name)
+    return dict(query.group_by(Product.name).all())
+
+
+def rebuilt_regions(db, file_id, user_id, start_date=None, end_date=None):
+    query = db.query(Region.name,
+                     func.sum(SalesRecord.quantity * SalesRecord.price).label("total_sales")) \
+              .join(Region, SalesRecord.region_id == Region.id) \
+              .filter(SalesRecord.file_key == rebuilt_file_key(db, file_id, user_id))
+    if start_date:
+        query = query.filter(SalesRecord.date_key >= to_date_key(start_date))
+    if end_date:
+        query = query.filter(SalesRecord.date_key <= to_date_key(end_date))
+    return dict(query.group_by(Region.name).all())
+
+
+def rebuilt_user(db, user_id):
+    return db.get(User, user_id)
+
+
+# --- Prepared ---
+def prepared_products(db, file_id, user_id, **filters):
+    return dict(db.execute(*products_query(resolve_file_key(db, file_id, user_id), **filters)).all())
+
+
+def prepared_regions(db, file_id, user_id, start_date=None, end_date=None):
+    return dict(db.execute(*regions_query(resolve_file_key(db, file_id, user_id), start_date, end_date)).all())
+
+
+def prepared_user(db, user_id):
+    return db.scalar(USER_BY_ID, {"user_id": user_id})
+
+
+def cpu_per_request(Session, requests, call) -> float:
+    # A session per request, like the get_db dependencies
+    start = time.process_time()
+    for i in range(requests):
+        with Session() as db:
+            call(db, i)
+    return (time.process_time() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="requests per case")
+    parser.add_argument("--rows", type=int, default=2000, help="rows of the upload being queried")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        migrate(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            user = User(name="bench", age=30, password="x")
+            upload = UploadedFile(id=FILE_ID, filename="bench", status="done", user=user)
+            db.add_all([user, upload])
+            db.commit()
+            insert_sales_frame(db, upload.file_key, clean_frame(make_frame(args.rows)), new_dimensions())
+            db.commit()
+            user_id = user.id
+
+        cases = {
+            "products (16 filter sets)": (
+                lambda db, i: rebuilt_products(db, FILE_ID, user_id, **FILTERS[i % len(FILTERS)]),
+                lambda db, i: prepared_products(db, FILE_ID, user_id, **FILTERS[i % len(FILTERS)]),
+            ),
+            "regions by date": (
+                lambda db, i: rebuilt_regions(db, FILE_ID, user_id, "2024-03-01", "2024-06-30"),
+                lambda db, i: prepared_regions(db, FILE_ID, user_id, "2024-03-01", "2024-06-30"),
+            ),
+            "current user": (
+                lambda db, i: rebuilt_user(db, user_id),
+                lambda db, i: prepared_user(db, user_id),
+            ),
+        }
+        print(f"{args.requests} requests per case, {args.rows:,} sales rows")
+        for name, (rebuilt, prepared) in cases.items():
+            with Session() as db:
+                # Same answers, and both paths warmed up (compiled cache, lru_cache)
+                for i in range(len(FILTERS)):
+                    assert rebuilt(db, i) == prepared(db, i), name
+            before = cpu_per_request(Session, args.requests, rebuilt)
+            after = cpu_per_request(Session, args.requests, prepared)
+            print(f"{name:<28} rebuilt {before * 1e6:8.0f} us   prepared {after * 1e6:8.0f} us   "
+                  f"{1 - after / before:6.0%} less CPU")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/check_incremental_vacuum.py
+#
+# Asserts that reclaiming free pages after a purge really gives them back in
+# steps of PURGE_VACUUM_PAGES: deletes the sales rows of a freshly migrated
+# SQLite database, checks that one incremental_vacuum() call frees exactly
+# `pages` pages and that reclaim_free_pages() then empties the free list.
+# Exits with status 1 if either frees fewer.
+#
+#   python -m benchmarks.check_incremental_vacuum --rows 200000 --pages 2000
+
+import argparse
+import os
+import sys
+import tempfile
+
+from sqlalchemy.orm import sessionmaker
+
+from apps.core.database import incremental_vacuum, sqlite_engine
+from apps.core.migrations import migrate
+from apps.models.salesRecord import SalesRecord
+from apps.service.ingestion import clean_frame, insert_sales_frame, new_dimensions
+from apps.service.retention import delete_sales_rows_in_batches, reclaim_free_pages
+from benchmarks.bench_bulk_insert import make_frame
+
+
+def free_pages(db) -> int:
+    return db.connection(bind_arguments={"mapper": SalesRecord}).exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000, help="sales rows inserted, then deleted")
+    parser.add_argument("--pages", type=int, default=2000, help="pages freed per step")
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlite_engine(f"sqlite:///{os.path.join(tmp, 'vacuum.db')}")
+        migrate(engine)
+        db = sessionmaker(bind=engine)()
+        insert_sales_frame(db, 1, clean_frame(make_frame(args.rows)), new_dimensions())
+        db.commit()
+        delete_sales_rows_in_batches(db, 1)
+
+        free = free_pages(db)
+        step = min(args.pages, free)
+        incremental_vacuum(db.connection(bind_arguments={"mapper": SalesRecord}), args.pages)
+        db.commit()
+        freed = free - free_pages(db)
+        ok = freed == step
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} one step freed {freed:,} of {free:,} free pages (expected {step:,})")
+
+        released = reclaim_free_pages(db, args.pages)
+        left = free_pages(db)
+        ok = left == 0
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} reclaim_free_pages released {released:,} pages, {left:,} left")
+        db.close()
+        engine.dispose()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/check_query_plans.py
+#
+# Asserts that every /analytics/* SQL query reads sales_records through one of
+# its covering indexes (no full-table scan), using SQLite's EXPLAIN QUERY PLAN
+# on a freshly migrated database. When sales_records is the inner side of a
+# join, the index lookup must also use the join key, not just the file id.
+# Exits with status 1 if any query does not.
+#
+#   python -m benchmarks.check_query_plans
+
+import os
+import sys
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from apps.api.routers.analytics import products_query, regions_query, monthly_query
+from apps.core.database import sqlite_engine
+from apps.core.migrations import migrate
+from apps.service.ingestion import clean_frame, insert_sales_frame, new_dimensions
+from benchmarks.bench_bulk_insert import make_frame
+
+CASES = {
+    "products": lambda: products_query(1),
+    "products by date": lambda: products_query(1, "2024-03-01", "2024-06-30"),
+    "products by region": lambda: products_query(1, region="Baku"),
+    "products by product": lambda: products_query(1, product_name="Product 7"),
+    "products, all filters": lambda: products_query(1, "2024-03-01", "2024-06-30", "Baku", "Product 7"),
+    "regions": lambda: regions_query(1),
+    "regions by date": lambda: regions_query(1, "2024-03-01", "2024-06-30"),
+    "monthly trends": lambda: monthly_query(1),
+}
+
+
+def plan(db, statement, params):
+    sql = str(statement.params(params).compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def uses_index(lines) -> bool:
+    found = False
+    for i, line in enumerate(lines):
+        if "sales_records" not in line:
+            continue
+        found = True
+        if "INDEX" not in line:
+            return False
+        inner = any(earlier.startswith("SCAN") for earlier in lines[:i])
+        if inner and "product_id=" not in line and "region_id=" not in line:
+            return False
+    return found
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlite_engine(f"sqlite:///{os.path.join(tmp, 'plans.db')}")
+        migrate(engine)
+        db = sessionmaker(bind=engine)()
+        # A few uploads, so the planner has realistic statistics
+        dimensions = new_dimensions()
+        for i in range(1, 4):
+            insert_sales_frame(db, i, clean_frame(make_frame(20_000)), dimensions)
+        db.commit()
+        db.execute(text("ANALYZE"))
+
+        for name, build in CASES.items():
+            lines = plan(db, *build())
+            ok = uses_index(lines)
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name}")
+            for line in lines:
+                print(f"       {line}")
+        db.close()
+        engine.dispose()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
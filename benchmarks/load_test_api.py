@@ -0,0 +1,71 @@
+# benchmarks/load_test_api.py
+#
+# Concurrent-request throughput of one API worker: logs in, creates a post, then
+# keeps `--concurrency` clients busy on the async endpoints (read post, current
+# user, create post) and reports requests/s and latency percentiles.
+#
+#   uvicorn apps.main:app --workers 1 --port 8000      # in another shell
+#   python -m benchmarks.load_test_api --requests 5000 --concurrency 64
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+async def setup(client):
+    name = f"load-{uuid.uuid4().hex[:8]}"
+    (await client.post("/users/register", json={"name": name, "age": 30, "password": "load"})).raise_for_status()
+    token = (await client.post("/users/login", data={"username": name, "password": "load"})).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    user = (await client.get("/users/me")).json()
+    post = (await client.post("/create-post/", json={"title": "load", "body": "test", "author_id": user["id"]})).json()
+    return user["id"], post["id"]
+
+
+async def run(url, total, concurrency, write_every):
+    async with httpx.AsyncClient(base_url=url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        user_id, post_id = await setup(client)
+        latencies = []
+        errors = 0
+        next_request = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for i in next_request:
+                if write_every and i % write_every == 0:
+                    request = client.post("/create-post/", json={"title": "load", "body": str(i), "author_id": user_id})
+                elif i % 2:
+                    request = client.get("/users/me")
+                else:
+                    request = client.get(f"/read-one-post/{post_id}")
+                start = time.perf_counter()
+                response = await request
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000  # noqa: E731
+    print(f"{total:,} requests, {concurrency} concurrent, {errors} errors")
+    print(f"{total / elapsed:,.0f} req/s  p50 {pct(0.50):.1f} ms  p95 {pct(0.95):.1f} ms  p99 {pct(0.99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-every", type=int, default=10, help="every Nth request creates a post (0 = reads only)")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency, args.write_every))
+
+
+if __name__ == "__main__":
+    main()